@@ -1,34 +1,126 @@
 import os
 import json
-import time
-import threading
-import openai
-import tiktoken
-from flask import Flask, render_template, request
-from modules.scraper_selenium import fetch_google_maps_reviews
-from modules.analysis import keyword_stats
-import re
-from collections import Counter
+from flask import Flask, render_template, request, redirect, url_for, jsonify, abort, Response
+from modules.analysis import init_jieba
+from modules.jobs import get_job_manager
+from modules.result_cache import get_result_cache
+from modules.places import extract_place_id
+from modules.review_sessions import new_result_id, save_session, load_session, ensure_session, \
+    page_reviews
 from datetime import datetime
 from markupsafe import escape, Markup
 from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError   # 注意這裡改成從 openai import OpenAI
+
+# selenium / bs4（爬蟲）、sqlalchemy（評論資料庫）、openai / tiktoken（modules/llm.py）都改成用到時才 import，
+# 只看首頁的請求與 worker 開機都不用載入它們；見 modules/startup_budget.py 的量測。
 
 load_dotenv()
+
+# job、Chromium pool、評論暫存的記憶體層、檢索索引與限速排隊都是每個 process 各一份，
+# 多個 worker 時請求落到別的 worker 就找不到 job / 結果：只能跑一個 worker process
+#（uvicorn / gunicorn 的 --workers 1），併發靠 event loop 或 threads，見 asgi.py 與 Dockerfile
+
 app = Flask(__name__)
 
-# 在程式一開始就建立好 OpenRouter client
-router_client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY")
-)
+# worker 啟動時就載入 jieba 字典，不要讓第一個使用者請求付這 1 秒
+# （搭配 gunicorn --preload 只在 master 載入一次，fork 出來的 worker 共用記憶體）
+if os.getenv("JIEBA_PRELOAD", "1") == "1":
+    init_jieba()
+
+
+# 每涵蓋一年允許捲動幾次（爬蟲的 scroll_times 上限）
+SCROLLS_PER_YEAR = int(os.getenv("SCRAPER_SCROLLS_PER_YEAR", "60"))
+
+
+def year_options():
+    current_year = datetime.now().year
+    return list(range(current_year, current_year - 21, -1))
+
+def run_analysis(place_id, place_url, start_year, end_year, progress=None):
+    """
+    爬評論 + 關鍵字 + 星等統計，回傳 results.html 需要的內容（在背景 job 裡執行）。
+    跨多年的區間只捲動一次，再依年份分桶各算一份星等與關鍵字。
+    """
+    from modules.review_store import fetch_reviews_incremental, refresh_keyword_counts, \
+        top_keywords, keyword_ratings
+
+    # 記下爬蟲最後回報的旗標（有沒有捲到 start_year、是否用完捲動上限）
+    scrape = {}
+
+    def track(**fields):
+        scrape.update(fields)
+        if progress:
+            progress(**fields)
+
+    # 已追蹤的店家只補抓新評論，其餘從資料庫取
+    reviews = fetch_reviews_incremental(
+        place_id,
+        place_url,
+        start_year=start_year,
+        end_year=end_year,
+        # 新到舊排序要從今天一路捲到 start_year，不只 end_year - start_year 這幾年；
+        # 依日期提早停止，scroll_times 只是上限
+        scroll_times=SCROLLS_PER_YEAR * (datetime.now().year - start_year + 1),
+        scroll_pause=1.5,
+        debug=os.getenv("SCRAPER_DEBUG") == "1",
+        progress=track
+    )
+    # 捲動上限用完卻還沒碰到 start_year：較舊的評論沒抓完，結果頁要提示
+    truncated = bool(scrape.get("scroll_capped")) and not scrape.get("reached_start_year")
+
+    if progress:
+        progress(stage="analyzing", reviews_found=len(reviews))
+    # 只分詞新進的評論，詞頻累加在資料庫的每年詞頻表，Top N 直接加總各年
+    analysis_timing = refresh_keyword_counts(place_id)
+    # 新評論順便加進全文檢索索引
+    from modules.review_search import index_pending
+    index_pending()
+    stats = top_keywords(place_id, start_year, end_year, top_n=20)
 
+    # 星等分佈、各年度與每月統計都從同一份欄式陣列算（modules/aggregate.py）
+    from modules.aggregate import ReviewFrame, CHART_KEYWORDS
+    frame = ReviewFrame(reviews)
+    rating_counts = frame.rating_histogram()
+    # 各年度（新到舊）
+    by_year = frame.by_year(range(end_year - 1, start_year - 1, -1))
+    for y in by_year:
+        y["stats"] = top_keywords(place_id, y["year"], y["year"] + 1, top_n=10)
+    # 關鍵字 × 星等直接從詞頻表加總，不掃評論原文
+    charts = frame.chart_datasets(keyword_ratings(
+        place_id, [s["keyword"] for s in stats[:CHART_KEYWORDS]], start_year, end_year))
 
+    # /ask 用 result_id 從伺服器端取評論，頁面上不用再夾帶整包評論
+    result_id = save_session(new_result_id(), reviews, place_id=place_id,
+                             start_year=start_year, end_year=end_year)
+    result = dict(
+        result_id=result_id,
+        reviews=reviews,
+        stats=stats,
+        rating_counts=rating_counts,
+        by_year=by_year,
+        charts=charts,
+        analysis_timing=analysis_timing,
+        truncated=truncated,
+        start_year=start_year,
+        end_year=end_year
+    )
+    get_result_cache().set((place_id, start_year, end_year), result)
+    return result
+
+def render_results(result):
+    """顯示結果頁；評論暫存若已過期（或存在別的 worker 記憶體裡）就以同一個 result_id 重新存"""
+    result = dict(result)
+    result["result_id"] = ensure_session(
+        result.get("result_id") or new_result_id(), result["reviews"],
+        start_year=result.get("start_year"), end_year=result.get("end_year")
+    )
+    # 評論列表只先放第一頁，其餘由頁面捲動時向 /results/<result_id>/reviews 取
+    result["review_count"] = len(result["reviews"])
+    result["first_page"] = page_reviews(result.pop("reviews"))
+    return render_template("results.html", **result)
 
 @app.route("/", methods=["GET", "POST"])
 def index():
-    current_year = datetime.now().year
-    years = list(range(current_year, current_year - 21, -1))
     error = None
 
     if request.method == "POST":
@@ -43,42 +135,187 @@ def index():
             try:
                 start_year = int(start_year)
                 end_year   = int(end_year)
+            except (TypeError, ValueError):
+                error = "請選擇起始與結束年份"
+            else:
+                key = (place_id, start_year, end_year)
+                # 快取命中就直接出結果；勾選「強制重新分析」則略過快取
+                if request.form.get("force_refresh") != "1":
+                    cached = get_result_cache().get(key)
+                    if cached is not None:
+                        return render_results(cached)
 
-                reviews = fetch_google_maps_reviews(
-                    place_url,
-                    scroll_times=15,
-                    scroll_pause=1.5,
-                    start_year=start_year,
-                    end_year=end_year,
-                    debug=True
+                # 丟到背景執行，立刻導向進度頁；同一家店同一區間正在跑時會共用同一個 job
+                job = get_job_manager().submit(
+                    key,
+                    run_analysis, place_id, place_url, start_year, end_year
                 )
+                return redirect(url_for("job_page", job_id=job.id))
 
-                texts = [r['text'] for r in reviews]
-                stats_df = keyword_stats(texts, top_n=20)
-                stats = stats_df.to_dict(orient="records")
-
-                ratings = [r['rating'] for r in reviews if r.get('rating') is not None]
-                cnt = Counter(ratings)
-                rating_counts = {star: cnt.get(star, 0) for star in [5,4,3,2,1]}
-
-                return render_template(
-                    "results.html",
-                    reviews=reviews,
-                    stats=stats,
-                    rating_counts=rating_counts,
-                    start_year=start_year,
-                    end_year=end_year
-                )
-            except ValueError as ve:
-                error = str(ve)
-            except Exception as e:
-                error = "爬蟲發生錯誤：" + str(e)
+    return render_template("index.html", years=year_options(), error=error)
+
+def get_job_or_404(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+@app.route("/jobs/<job_id>")
+def job_page(job_id):
+    job = get_job_or_404(job_id)
+    return render_template("job.html", job=job.to_dict())
+
+@app.route("/jobs/<job_id>/status")
+def job_status(job_id):
+    job = get_job_or_404(job_id)
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-Sent Events：狀態有變就推送一次，完成或失敗後結束串流"""
+    manager = get_job_manager()
+    job = get_job_or_404(job_id)
+
+    def stream():
+        version = -1
+        while True:
+            new_version = manager.wait_for_change(job, version)
+            if new_version == version:
+                # 逾時沒有變化，送個註解保持連線
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            yield f"data: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+            if job.status in ("done", "error"):
+                break
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    """
+    批次爬多家店：JSON body {"urls": [...], "start_year": 2024, "end_year": 2025}
+    評論寫進資料庫，回傳 job_id；進度與最後的統計（progress.summary）可用 /jobs/<job_id>/status 查詢。
+    """
+    from modules.batch import run_batch
+    from modules.driver_pool import get_driver_pool
+    from modules.scraper_selenium import init_driver
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "body 必須是 JSON 物件"}), 400
+    urls = body.get("urls")
+    # 字串也能迭代，不檢查會被拆成一個個字元
+    if not isinstance(urls, list) or not all(isinstance(u, str) for u in urls):
+        return jsonify({"error": "urls 必須是字串陣列"}), 400
+    urls = [u.strip() for u in urls if u.strip()]
+    if not urls:
+        return jsonify({"error": "請提供 urls 陣列"}), 400
+    invalid = [u for u in urls if not extract_place_id(u)]
+    if invalid:
+        return jsonify({"error": "無法從網址抽出 place_id，請確認格式", "invalid_urls": invalid}), 400
+    try:
+        start_year = int(body["start_year"]) if body.get("start_year") else None
+        end_year = int(body["end_year"]) if body.get("end_year") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "start_year / end_year 必須是整數"}), 400
+    # 瀏覽器一律從 process 共用的 pool 借，同時爬的家數不超過 pool 大小
+    pool_size = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+    try:
+        workers = int(body.get("workers", pool_size))
+    except (TypeError, ValueError):
+        return jsonify({"error": "workers 必須是整數"}), 400
+    if workers < 1:
+        return jsonify({"error": "workers 必須大於 0"}), 400
+    workers = min(workers, pool_size)
 
-    return render_template("index.html", years=years, error=error)
+    job = get_job_manager().submit(
+        ("batch", tuple(urls), start_year, end_year),
+        run_batch, urls,
+        workers=workers, pool=get_driver_pool(init_driver),
+        fmt="sqlite", start_year=start_year, end_year=end_year
+    )
+    return jsonify({
+        "job_id": job.id,
+        "status_url": url_for("job_status", job_id=job.id)
+    }), 202
+
+@app.route("/cache/stats")
+def cache_stats():
+    from modules.answer_cache import get_answer_cache
+    return jsonify(dict(get_result_cache().stats(), answer_cache=get_answer_cache().stats()))
+
+@app.route("/results/<result_id>/reviews")
+def result_reviews(result_id):
+    """
+    分頁取評論（JSON）：?cursor=&limit=20&rating=5&year=2024&sort=newest|oldest|rating_desc|rating_asc
+    回傳 {"reviews": [...], "next_cursor": ..., "total": ...}
+    """
+    session = load_session(result_id)
+    if session is None:
+        return jsonify({"error": "這份分析結果已過期，請回首頁重新分析。"}), 404
+    try:
+        page = page_reviews(
+            session["reviews"],
+            cursor=request.args.get("cursor") or None,
+            limit=request.args.get("limit", type=int),
+            rating=request.args.get("rating", type=int),
+            year=request.args.get("year", type=int),
+            sort=request.args.get("sort", "newest"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@app.route("/search")
+def search_reviews():
+    """
+    全文檢索已爬過的評論（JSON）：
+    ?q=早餐 好吃&place_id=&rating=5&year=2024（或 start_date / end_date，YYYY-MM-DD）&limit=20&offset=0
+    """
+    from modules.review_search import search
+    try:
+        start_date = request.args.get("start_date") or None
+        end_date = request.args.get("end_date") or None
+        if start_date:
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        if end_date:
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+        year = request.args.get("year", type=int)
+        if year:
+            start_date = datetime(year, 1, 1).date()
+            end_date = datetime(year + 1, 1, 1).date()
+        result = search(
+            request.args.get("q", ""),
+            place_id=request.args.get("place_id") or None,
+            rating=request.args.get("rating", type=int),
+            start_date=start_date,
+            end_date=end_date,
+            limit=max(1, min(request.args.get("limit", 20, type=int), 100)),
+            offset=max(request.args.get("offset", 0, type=int), 0),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@app.route("/llm/stats")
+def llm_stats():
+    """AI 呼叫的限速統計：各優先順序的排隊時間、重試與 429 次數"""
+    from modules.rate_limit import get_rate_limiter
+    return jsonify(get_rate_limiter().stats())
 
-def extract_place_id(url):
-    m = re.search(r"/place/([^/?]+)", url)
-    return m.group(1) if m else None
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = get_job_or_404(job_id)
+    if job.status == "done":
+        return render_results(job.result)
+    if job.status == "error":
+        if isinstance(job.exception, ValueError):
+            error = job.error
+        else:
+            error = "爬蟲發生錯誤：" + job.error
+        return render_template("index.html", years=year_options(), error=error)
+    return redirect(url_for("job_page", job_id=job.id))
 
 @app.template_filter('nl2br')
 def nl2br(s):
@@ -86,61 +323,202 @@ def nl2br(s):
     escaped = escape(s)
     return Markup(escaped.replace('\n', '<br>\n'))
 
+ASK_PARAMS = dict(temperature=0.7, max_tokens=2000)
+TRUNCATED_NOTICE = "\n\n（⚠️ 回答長度達模型上限，回答已中斷。）"
+
+def prepare_ask(result_id, question, record=True):
+    """
+    /ask 與 /ask/stream 共用：檢查問題、用 result_id 取回評論、查回答快取。
+    回傳 dict(reviews, corpus, params, cached, cache_match)；問題或 result_id 不對就丟 ValueError。
+    串流時同一個問題會先經過 POST /ask 再連 /ask/stream，第二次查快取傳 record=False，命中率才不會重複計算。
+    """
+    from modules.llm import LLM_MODEL
+    from modules.answer_cache import get_answer_cache, corpus_hash
+    if not question:
+        raise ValueError("請輸入問題。")
+    session = load_session(result_id)
+    if session is None:
+        raise ValueError("這份分析結果已過期，請回首頁重新分析。")
+    reviews = session["reviews"]
+
+    # 同一份評論問過同樣的問題就直接用快取的回答
+    corpus = session.get("corpus_hash") or corpus_hash(reviews)
+    params = dict(ASK_PARAMS, model=LLM_MODEL)
+    cached, cache_match = get_answer_cache().get(corpus, question, record=record, **params)
+    return dict(reviews=reviews, corpus=corpus, params=params,
+                cached=cached, cache_match=cache_match)
+
+def build_messages(reviews, question, corpus=None):
+    """
+    評論不多就整包送；太多則依問題檢索最相關的評論，對不上才退回 map-reduce 摘要（有快取）。
+    回傳 (messages, context_stats)
+    """
+    from modules.summarize import build_context
+    content, context_stats = build_context(reviews, question, corpus)
+    if context_stats["mode"] == "direct":
+        intro = "以下是所有評論："
+    elif context_stats["mode"] == "retrieval":
+        intro = (f"以下是與問題最相關的 {len(context_stats['sources'])} 則評論"
+                 f"（共 {context_stats['reviews']} 則，編號可用來引用）：")
+    else:
+        intro = f"以下是 {context_stats['reviews']} 則評論整理後的重點摘要："
+
+    # 固定的系統訊息與評論內容放前面、問題放最後：同一份評論的後續提問前綴完全相同，
+    # 供應商端的 prompt prefix cache（例如 DeepSeek 的 context caching）才能命中
+    messages = [
+        {"role": "system", "content": "從現在開始，請全部使用繁體中文回答所有問題。"},
+        {"role": "system", "content": "你是一個專業的店家評論分析助理。"},
+        {"role": "user",   "content": f"{intro}\n\n{content}"},
+        {"role": "user",   "content": question}
+    ]
+    return messages, context_stats
+
 @app.route("/ask", methods=["POST"])
 def ask():
+    from openai import OpenAIError
+    from modules.llm import chat, normalize_breaks
+    from modules.answer_cache import get_answer_cache
     error = None
+    answer = None
+    context_stats = None
+    cache_match = None
+    streaming = False
+    result_id = request.form.get("result_id", "")
+    question = request.form.get("user_question", "").strip()
     try:
-        reviews = json.loads(request.form["reviews_json"])
-        question = request.form["user_question"].strip()
-        if not question:
-            raise ValueError("請輸入問題。")
-
-        # 合併所有評論文字
-        texts = [r.get("text","") for r in reviews]
-        content = "\n\n".join(texts)
-
-        messages = [
-            {"role": "system", "content": "從現在開始，請全部使用繁體中文回答所有問題。"},
-            {"role": "system", "content": "你是一個專業的店家評論分析助理。"},
-            {"role": "user",   "content": f"以下是所有評論：\n\n{content}"},
-            {"role": "user",   "content": question}
-        ]
-
-        # 多給一些 max_tokens，避免回答被截斷
-        resp = router_client.chat.completions.create(
-            model="deepseek/deepseek-r1-0528",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=2000,    # 原本 800 提升到 1500
-            extra_headers={},
-            extra_body={}
-        )
-        answer_raw = resp.choices[0].message.content.strip()
+        ctx = prepare_ask(result_id, question)
+        cache_match = ctx["cache_match"]
+        if ctx["cached"] is not None:
+            answer = ctx["cached"]["answer"]
+            context_stats = ctx["cached"].get("context_stats")
+        elif request.form.get("stream") == "1" and os.getenv("ASK_STREAMING", "1") == "1":
+            # 有 JS 的頁面：先回一個空的回答頁，再由頁面用 SSE 連 /ask/stream 逐字顯示
+            streaming = True
+        else:
+            messages, context_stats = build_messages(ctx["reviews"], question, ctx["corpus"])
+            # 多給一些 max_tokens，避免回答被截斷
+            resp = chat(messages, **ctx["params"])
 
-        # 把 AI 回傳中的 <br> 標籤換成換行
-        answer = re.sub(r'<br\s*/?>', '\n', answer_raw)
+            # 把 AI 回傳中的 <br> 標籤換成換行
+            answer = normalize_breaks(resp.choices[0].message.content.strip())
 
-        # 如果模型真的跑到 token 上限，finish_reason 會是 "length"
-        if resp.choices[0].finish_reason == "length":
-            answer += "\n\n（⚠️ 回答長度達模型上限，回答已中斷。）"
+            # 如果模型真的跑到 token 上限，finish_reason 會是 "length"
+            if resp.choices[0].finish_reason == "length":
+                answer += TRUNCATED_NOTICE
+            else:
+                get_answer_cache().set(ctx["corpus"], question,
+                                       {"answer": answer, "context_stats": context_stats},
+                                       **ctx["params"])
 
     except OpenAIError as e:
         error = f"AI 呼叫失敗：{e}"
-        question = request.form.get("user_question","")
-        answer = None
     except Exception as e:
         error = str(e)
-        question = request.form.get("user_question","")
-        answer = None
 
     return render_template(
         "answer.html",
         error=error,
         question=question,
         answer=answer,
-        reviews_json=request.form["reviews_json"]
+        streaming=streaming,
+        context_stats=context_stats,
+        cache_match=cache_match,
+        result_id=result_id
     )
 
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class AnswerStream:
+    """
+    把串流回答轉成 SSE 事件：<br> 正規化、思考中提示、最後的截斷提示與寫入回答快取。
+    /ask/stream（Flask）與 asgi.py 的非同步版本共用，只差在怎麼取得串流 chunk。
+    """
+
+    def __init__(self, ctx, question, context_stats):
+        from modules.llm import BreakNormalizer
+        self.ctx = ctx
+        self.question = question
+        self.context_stats = context_stats
+        self.normalizer = BreakNormalizer()
+        self.parts = []
+        self.finish_reason = None
+        self.thinking_sent = False
+
+    def feed(self, kind, text, finish):
+        """處理一個 (kind, text, finish_reason)，回傳要送出的 SSE 字串 list"""
+        if kind == "reasoning":
+            if self.thinking_sent:
+                return []
+            self.thinking_sent = True
+            return [sse("thinking", {"stage": "reasoning"})]
+        self.finish_reason = finish or self.finish_reason
+        out = self.normalizer.feed(text)
+        if not out:
+            return []
+        self.parts.append(out)
+        return [sse("delta", {"text": out})]
+
+    def close(self):
+        """串流結束：送出剩下的文字與 done；沒被截斷的回答寫入快取"""
+        from modules.answer_cache import get_answer_cache
+        events = []
+        out = self.normalizer.flush()
+        if out:
+            self.parts.append(out)
+            events.append(sse("delta", {"text": out}))
+        truncated = self.finish_reason == "length"
+        if truncated:
+            events.append(sse("delta", {"text": TRUNCATED_NOTICE}))
+        else:
+            get_answer_cache().set(self.ctx["corpus"], self.question,
+                                   {"answer": "".join(self.parts).strip(),
+                                    "context_stats": self.context_stats},
+                                   **self.ctx["params"])
+        events.append(sse("done", {"truncated": truncated, "context_stats": self.context_stats}))
+        return events
+
+def cached_answer_events(ctx):
+    cached = ctx["cached"]
+    return [sse("delta", {"text": cached["answer"]}),
+            sse("done", {"truncated": False, "cache_match": ctx["cache_match"],
+                         "context_stats": cached.get("context_stats")})]
+
+@app.route("/ask/stream")
+def ask_stream():
+    """
+    Server-Sent Events 逐段送出回答：
+    event: thinking（推理模型還在思考）、delta（新的回答文字）、done（結束，附 truncated / context_stats）、error。
+    用 asgi.py 啟動時這個路徑由非同步版本處理，不佔 thread。
+    """
+    from openai import OpenAIError
+    from modules.llm import chat_stream
+    result_id = request.args.get("result_id", "")
+    question = request.args.get("user_question", "").strip()
+
+    def stream():
+        try:
+            # POST /ask 已經查過一次並計入命中率
+            ctx = prepare_ask(result_id, question, record=False)
+            if ctx["cached"] is not None:
+                yield from cached_answer_events(ctx)
+                return
+
+            # 摘要可能要一點時間，先讓瀏覽器知道已經開始
+            yield sse("thinking", {"stage": "context"})
+            messages, context_stats = build_messages(ctx["reviews"], question, ctx["corpus"])
+            answer = AnswerStream(ctx, question, context_stats)
+            for kind, text, finish in chat_stream(messages, **ctx["params"]):
+                yield from answer.feed(kind, text, finish)
+            yield from answer.close()
+        except OpenAIError as e:
+            yield sse("error", {"error": f"AI 呼叫失敗：{e}"})
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 
 
 
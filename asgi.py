@@ -0,0 +1,137 @@
+# asgi.py
+"""
+非同步的服務入口：
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 1
+
+只能跑一個 worker process：JobManager、DriverPool、評論暫存的記憶體層、BM25 索引快取與
+RateLimiter 的排隊都在 process 裡，請求落到另一個 worker 就找不到 job / 結果。
+併發靠 event loop（串流）與 thread pool（其餘 Flask 路由）。
+
+會掛很久的兩個串流端點直接在 event loop 上處理，等待上游時不佔 thread：
+- /ask/stream：AsyncOpenAI 串流回答
+- /jobs/<id>/events：等背景爬蟲 job 的進度
+
+其餘路由（頁面、表單、/batch、統計）交給原本的 Flask app，由 asgiref 的 WsgiToAsgi 在
+thread pool 執行；爬蟲本來就是 JobManager 的背景工作，POST / 只是送出 job 就回傳。
+"""
+
+import re, json, asyncio
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from app import app as flask_app, prepare_ask, build_messages, sse, AnswerStream, \
+    cached_answer_events
+from modules.jobs import get_job_manager
+from modules.llm import achat_stream
+
+JOB_EVENTS_RE = re.compile(r"^/jobs/([0-9a-f]+)/events$")
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+async def send_stream(receive, send, events, status=200):
+    """
+    把 async generator 產生的字串一段段送出；瀏覽器斷線（http.disconnect）就取消串流，
+    generator 的 finally 會關掉上游連線（例如不再繼續產生付費的 token）。
+    """
+    await send({"type": "http.response.start", "status": status, "headers": SSE_HEADERS})
+
+    async def pump():
+        async for chunk in events:
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"),
+                        "more_body": True})
+
+    task = asyncio.ensure_future(pump())
+
+    async def watch():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                task.cancel()
+                return
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        await task
+    except asyncio.CancelledError:
+        return
+    finally:
+        watcher.cancel()
+        await events.aclose()
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def ask_events(result_id, question):
+    """/ask/stream 的非同步版本，事件格式與 Flask 版相同"""
+    from openai import OpenAIError
+    try:
+        # 讀評論暫存 / 回答快取可能碰到 SQLite，丟到 thread 執行
+        # POST /ask 已經查過一次並計入命中率
+        ctx = await asyncio.to_thread(prepare_ask, result_id, question, record=False)
+        if ctx["cached"] is not None:
+            for event in cached_answer_events(ctx):
+                yield event
+            return
+
+        yield sse("thinking", {"stage": "context"})
+        # 評論很多時要建檢索索引或做 map-reduce 摘要（同步的多個呼叫，有快取），同樣丟到 thread
+        messages, context_stats = await asyncio.to_thread(build_messages, ctx["reviews"], question,
+                                                          ctx["corpus"])
+        answer = AnswerStream(ctx, question, context_stats)
+        async for kind, text, finish in achat_stream(messages, **ctx["params"]):
+            for event in answer.feed(kind, text, finish):
+                yield event
+        for event in await asyncio.to_thread(answer.close):
+            yield event
+    except OpenAIError as e:
+        yield sse("error", {"error": f"AI 呼叫失敗：{e}"})
+    except Exception as e:
+        yield sse("error", {"error": str(e)})
+
+
+async def job_events(job):
+    """/jobs/<id>/events 的非同步版本：狀態有變就推送一次，完成或失敗後結束"""
+    manager = get_job_manager()
+    version = -1
+    while True:
+        new_version = await manager.wait_for_change_async(job, version)
+        if new_version == version:
+            yield ": keep-alive\n\n"
+            continue
+        version = new_version
+        yield f"data: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+        if job.status in ("done", "error"):
+            break
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "http" and scope["method"] == "GET":
+        path = scope["path"]
+        if path == "/ask/stream":
+            query = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+            result_id = query.get("result_id", [""])[0]
+            question = query.get("user_question", [""])[0].strip()
+            return await send_stream(receive, send, ask_events(result_id, question))
+
+        m = JOB_EVENTS_RE.match(path)
+        if m:
+            job = get_job_manager().get(m.group(1))
+            if job is not None:
+                return await send_stream(receive, send, job_events(job))
+            # 找不到 job 就交給 Flask 回 404
+
+    await flask_asgi(scope, receive, send)
@@ -0,0 +1,147 @@
+# modules/aggregate.py
+"""
+結果頁的星等與時間序列統計：評論先轉成一次欄式陣列（NumPy），之後每種統計都是
+bincount / cumsum 之類的向量運算，不再對評論 dict 跑 Python 迴圈。
+
+    frame = ReviewFrame(reviews)
+    frame.rating_histogram()          # {5: n, 4: n, ..., 1: n}
+    frame.by_year(range(2024, 2019, -1))
+    frame.chart_datasets()            # 給 results.html 的 Chart.js 資料
+
+關鍵字 × 星等交叉表不掃原文：分詞時就把各星等的 docs 累加在 keyword_counts
+（review_store.keyword_ratings），這裡只負責把計數表整理成圖表格式（keyword_rating_table）。
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+STARS = [5, 4, 3, 2, 1]
+# 月平均星等的移動平均視窗（月）
+MOVING_AVERAGE_MONTHS = int(os.getenv("CHART_MOVING_AVG_MONTHS", "3"))
+# 「關鍵字 × 星等」交叉表最多取幾個關鍵字
+CHART_KEYWORDS = int(os.getenv("CHART_KEYWORDS", "10"))
+
+
+def _round(values, digits=2):
+    """轉成 JSON 用的 list，NaN（該月沒有評論）變成 None，圖表會留空"""
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def keyword_rating_table(keywords, table):
+    """
+    關鍵字 × 星等交叉表的圖表格式。table 是 (關鍵字數, 6) 的計數，第 j 欄是 j 星的評論數，
+    第 0 欄是沒有星等的評論；回傳各星等則數、平均星等與提到的評論數。
+    """
+    keywords = list(keywords)
+    table = np.asarray(table, dtype=np.int64).reshape(len(keywords), 6)
+    n_rated = table[:, 1:].sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = (table * np.arange(6)).sum(axis=1) / n_rated
+    return {
+        "labels": keywords,
+        "counts": {star: table[:, star].tolist() for star in STARS},
+        "avg_rating": _round(avg),
+        "mentions": table.sum(axis=1).tolist(),
+    }
+
+
+class ReviewFrame:
+    """
+    評論的欄式表示：
+    - rating：int8，沒有星等的是 0
+    - month：datetime64[M]，沒有日期的是 NaT
+    """
+
+    def __init__(self, reviews):
+        # None 轉成 float 是 NaN，再換成 0（沒有星等）
+        rating = np.array([r.get("rating") for r in reviews], dtype=float)
+        self.rating = np.nan_to_num(rating, nan=0.0).astype(np.int8)
+        # 日期是 ISO 字串（YYYY-MM-DD）：不重複的日期只有幾千個，只解析這些再用 codes 展開；
+        # 沒有日期的 code 是 -1，剛好取到最後補上的 NaT
+        codes, uniques = pd.factorize(np.array([r.get("date") for r in reviews], dtype=object))
+        days = np.append(np.asarray(uniques, dtype="datetime64[D]"), np.datetime64("NaT"))
+        self.month = days.astype("datetime64[M]")[codes]
+
+    def __len__(self):
+        return len(self.rating)
+
+    def _star_counts(self, mask=None):
+        rating = self.rating if mask is None else self.rating[mask]
+        return np.bincount(rating, minlength=6)
+
+    def rating_histogram(self, mask=None):
+        counts = self._star_counts(mask)
+        return {star: int(counts[star]) for star in STARS}
+
+    def by_year(self, years):
+        """各年的評論數、平均星等與星等分佈（years 的順序就是回傳的順序）"""
+        years = list(years)
+        if not years:
+            return []
+        first = min(years)
+        span = max(years) - first + 1
+        valid = ~np.isnat(self.month)
+        idx = self.month[valid].astype("datetime64[Y]").astype(np.int64) + 1970 - first
+        rating = self.rating[valid]
+        keep = (idx >= 0) & (idx < span)
+        # (年, 星等) 攤平成一維一次 bincount，0 星那欄是沒有星等的評論
+        table = np.bincount(idx[keep] * 6 + rating[keep], minlength=span * 6).reshape(span, 6)
+        n_rated = table[:, 1:].sum(axis=1)
+        total = (table * np.arange(6)).sum(axis=1)
+        out = []
+        for y in years:
+            row = table[y - first]
+            out.append({
+                "year": y,
+                "count": int(row.sum()),
+                "avg_rating": round(float(total[y - first] / n_rated[y - first]), 2)
+                if n_rated[y - first] else None,
+                "rating_counts": {star: int(row[star]) for star in STARS},
+            })
+        return out
+
+    def monthly(self, window=MOVING_AVERAGE_MONTHS):
+        """
+        從最早到最晚每個月（中間沒評論的月份也補上）的評論數、平均星等，
+        以及以評論數加權的 window 個月移動平均星等。
+        """
+        valid = ~np.isnat(self.month)
+        if not valid.any():
+            return {"labels": [], "count": [], "avg_rating": [], "moving_avg": [], "window": window}
+        months = self.month[valid].astype(np.int64)
+        first = months.min()
+        idx = months - first
+        size = int(idx.max()) + 1
+        rating = self.rating[valid]
+        rated = rating > 0
+        count = np.bincount(idx, minlength=size)
+        n_rated = np.bincount(idx[rated], minlength=size)
+        total = np.bincount(idx[rated], weights=rating[rated], minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg = total / n_rated
+            # 移動平均：前綴和相減就是每個視窗的加總
+            cs_total = np.cumsum(np.concatenate(([0.0], total)))
+            cs_rated = np.cumsum(np.concatenate(([0], n_rated)))
+            lo = np.maximum(np.arange(size) - window + 1, 0)
+            hi = np.arange(size) + 1
+            moving = (cs_total[hi] - cs_total[lo]) / (cs_rated[hi] - cs_rated[lo])
+        labels = np.arange(first, first + size).astype("datetime64[M]").astype(str)
+        return {
+            "labels": labels.tolist(),
+            "count": count.tolist(),
+            "avg_rating": _round(avg),
+            "moving_avg": _round(moving),
+            "window": window,
+        }
+
+    def chart_datasets(self, keyword_ratings=None, window=MOVING_AVERAGE_MONTHS):
+        """
+        results.html 的圖表資料，全部是可以直接 tojson 的 list / dict。
+        keyword_ratings 是 keyword_rating_table 的結果（從資料庫的詞頻表算），沒給就是空的。
+        """
+        return {
+            "rating_histogram": self.rating_histogram(),
+            "monthly": self.monthly(window),
+            "keyword_ratings": keyword_ratings or keyword_rating_table([], []),
+        }
@@ -1,14 +1,275 @@
-import jieba
-from collections import Counter
-import pandas as pd
-
-def keyword_stats(texts, top_n=20):
-    # 合併所有評論
-    corpus = ' '.join(texts)
-    # 分詞（可自行加入停用詞處理）
-    words = [w for w in jieba.cut(corpus) if len(w)>1]
-    cnt = Counter(words)
-    most_common = cnt.most_common(top_n)
-    # 轉成 DataFrame
-    df = pd.DataFrame(most_common, columns=['keyword','count'])
-    return df
+import os
+import time
+import threading
+import multiprocessing
+from dataclasses import dataclass, field
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# jieba / pandas 都是在真正用到時才 import，worker 開機（以及只看首頁的請求）不用付這些成本
+
+# 評論數超過這個門檻才丟給 process pool 平行分詞，少量評論直接在本 process 做比較快
+PARALLEL_THRESHOLD = int(os.getenv("ANALYSIS_PARALLEL_THRESHOLD", "2000"))
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+
+# 排名方式：tfidf（依評論長度正規化的 TF × IDF）、docs（幾則評論提到）、count（原始次數）
+KEYWORD_RANKING = os.getenv("KEYWORD_RANKING", "tfidf")
+# 詞組長度：1 = 單詞，2 = 加上二連詞，3 = 再加上三連詞
+MAX_NGRAM = int(os.getenv("KEYWORD_MAX_NGRAM", "2"))
+
+# 內建停用詞：評論裡出現很多但沒有資訊量的填充詞
+DEFAULT_STOPWORDS = """
+我們 你們 他們 她們 大家 自己 這個 那個 這些 那些 一個 一些 一下 一直 一樣 一起
+非常 真的 就是 還是 覺得 感覺 可以 沒有 因為 所以 但是 而且 如果 然後 還有 什麼
+這樣 那樣 比較 不會 很多 應該 已經 只是 其實 這裡 這邊 那邊 那裡 時候 地方 不過
+所有 有點 東西 以及 或是 雖然 這家 這次 下次 不是 也是 都是 都很 也很 可能 需要
+知道 有些 整體 整個 部分 另外 最後 之後 之前 目前 當時 還會 會再 實在 根本 完全
+特別 相當 十分 蠻多 而已 然而 只有 的話 來說 進去 出來 起來 一點 一次 每次 還算
+"""
+
+# 查詢時保留的單個中文字：本身就描述了評論重點（床、貴、吵…）。
+# 其他單字（的、是、有、很…）幾乎每則評論都有，當成查詢詞只會讓每則評論都「命中」
+QUERY_SINGLE_CHARS = frozenset("床貴髒吵臭冷熱暗舊新小大濕慢快爛棒讚鹹甜辣油窄")
+
+_pool = None
+_pool_lock = threading.Lock()
+_stopwords = None
+
+
+def init_jieba():
+    """
+    載入 jieba 字典。jieba 預設是第一次 cut 時才載入（約 1 秒），
+    在 worker 啟動時先呼叫就不會卡在使用者的第一個請求。
+    JIEBA_CACHE_DIR 可指定序列化字典快取的位置，讓之後啟動直接讀快取。
+    """
+    import jieba
+    cache_dir = os.getenv("JIEBA_CACHE_DIR")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        jieba.dt.tmp_dir = cache_dir
+    jieba.initialize()
+
+
+# 標點、空白等斷句位置以 BOUNDARY 保留在分詞結果裡，詞組不會跨句
+BOUNDARY = "|"
+
+
+def _segment_text(text, jieba):
+    words = []
+    for w in jieba.cut(text):
+        if len(w) > 1 and any(c.isalnum() for c in w):
+            words.append(w)
+        elif not any(c.isalnum() for c in w) and words and words[-1] != BOUNDARY:
+            words.append(BOUNDARY)
+    if words and words[-1] == BOUNDARY:
+        words.pop()
+    return words
+
+
+def _segment_chunk(texts):
+    import jieba
+    return [_segment_text(t, jieba) for t in texts]
+
+
+def _search_chunk(texts):
+    import jieba
+    # cut_for_search 會把長詞再切出短詞（「中華民國」→ 中華、華民、民國、中華民國），
+    # 單字也保留，查詢時不論用長詞或短詞都找得到
+    return [[w for w in jieba.cut_for_search(t or "") if any(c.isalnum() for c in w)]
+            for t in texts]
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 用 spawn 而不是 fork：gunicorn worker 裡有其他 thread，fork 可能卡死
+            _pool = ProcessPoolExecutor(
+                max_workers=ANALYSIS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_jieba
+            )
+        return _pool
+
+
+def _map_chunks(fn, texts):
+    """少量直接在本 process 做，評論很多時分批交給 process pool 平行處理"""
+    texts = list(texts)
+    if len(texts) < PARALLEL_THRESHOLD or ANALYSIS_WORKERS <= 1:
+        return fn(texts)
+    size = max(len(texts) // (ANALYSIS_WORKERS * 4), 1)
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+    tokens = []
+    for part in _get_pool().map(fn, chunks):
+        tokens.extend(part)
+    return tokens
+
+
+def segment(texts):
+    """逐篇分詞，回傳每篇評論的詞 list（去掉單字與標點，標點以 BOUNDARY 標記）"""
+    return _map_chunks(_segment_chunk, texts)
+
+
+def segment_for_search(texts):
+    """全文檢索用的分詞：細切、保留單字，回傳每篇評論的詞 list"""
+    return _map_chunks(_search_chunk, texts)
+
+
+def with_bigrams(words):
+    """
+    長度 3 以上的中文詞再補上二字子詞：jieba 的詞典是簡體，繁體的「停車位」不會再切出「停車」，
+    查「停車」就找不到；索引與查詢都要用同樣的方式展開，兩邊才對得上。
+    """
+    out = list(words)
+    for w in words:
+        if len(w) > 2 and all("\u4e00" <= c <= "\u9fff" for c in w):
+            out.extend(w[i:i + 2] for i in range(len(w) - 1))
+    return out
+
+
+def get_stopwords():
+    """
+    內建停用詞 + STOPWORDS_FILE（一行一個詞，可用逗號分隔多個檔案），
+    編成 frozenset 快取起來，查詢是 O(1)。
+    """
+    global _stopwords
+    if _stopwords is None:
+        words = set(DEFAULT_STOPWORDS.split())
+        for path in filter(None, os.getenv("STOPWORDS_FILE", "").split(",")):
+            with open(path.strip(), encoding="utf-8") as f:
+                words.update(line.strip() for line in f if line.strip())
+        _stopwords = frozenset(words)
+    return _stopwords
+
+
+def query_words(words):
+    """查詢的分詞結果去掉停用詞，以及不在 QUERY_SINGLE_CHARS 裡的單個中文字"""
+    stopwords = get_stopwords()
+    return [w for w in words if w not in stopwords and not (
+        len(w) == 1 and "\u4e00" <= w <= "\u9fff" and w not in QUERY_SINGLE_CHARS)]
+
+
+def doc_terms(words, max_ngram=None, stopwords=None):
+    """
+    把一篇評論的分詞結果轉成要統計的詞：去掉停用詞，
+    再把相鄰的詞接成二連詞 / 三連詞（例如「早餐」「好吃」→「早餐好吃」）；
+    標點與停用詞都視為斷點，詞組不會跨過它們。
+    """
+    if max_ngram is None:
+        max_ngram = MAX_NGRAM
+    if stopwords is None:
+        stopwords = get_stopwords()
+    terms, sentence = [], []
+    for w in list(words) + [BOUNDARY]:
+        if w != BOUNDARY and w not in stopwords:
+            sentence.append(w)
+            continue
+        # 一段結束：單詞 + 段內的連詞
+        terms.extend(sentence)
+        for n in range(2, max_ngram + 1):
+            terms.extend("".join(sentence[i:i + n]) for i in range(len(sentence) - n + 1))
+        sentence = []
+    return terms
+
+
+def idf(docs, n_docs):
+    """平滑 IDF：log((1 + N) / (1 + df)) + 1"""
+    return np.log((1 + n_docs) / (1 + np.asarray(docs, dtype=float))) + 1.0
+
+
+def top_indices(score, top_n):
+    """分數最高的 top_n 個 index（分數 > 0），argpartition 是 O(n)，只對這幾個排序"""
+    score = np.asarray(score)
+    k = min(top_n, len(score))
+    if k <= 0:
+        return []
+    top = np.argpartition(-score, k - 1)[:k]
+    top = top[np.lexsort((top, -score[top]))]
+    return [i for i in top if score[i] > 0]
+
+
+def rank_keywords(docs_terms, top_n=20, method=None, min_docs=1):
+    """
+    以 NumPy 向量化計算排名，不用 Python 迴圈逐詞累加：
+    把每個 (評論, 詞) 出現轉成兩個整數陣列（稀疏矩陣的 COO 形式），
+    次數、文件頻率、TF-IDF 都是 bincount。回傳 [{keyword, count, docs, score}]。
+    """
+    method = method or KEYWORD_RANKING
+    lengths = np.fromiter((len(t) for t in docs_terms), dtype=np.int64, count=len(docs_terms))
+    if not lengths.sum():
+        return []
+
+    import pandas as pd
+    # 詞 → 整數 id（hash 分組，比 dict 逐一 setdefault 快很多）
+    cols, terms = pd.factorize(np.fromiter(chain.from_iterable(docs_terms), dtype=object,
+                                           count=int(lengths.sum())))
+    rows = np.repeat(np.arange(len(docs_terms)), lengths)
+    n_docs = len(docs_terms)
+    n_terms = len(terms)
+
+    counts = np.bincount(cols, minlength=n_terms)
+    # 文件頻率：同一篇裡重複的詞只算一次（排序後去掉相鄰重複的 (評論, 詞)）
+    pairs = np.sort(rows * n_terms + cols)
+    pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+    docs = np.bincount(pairs % n_terms, minlength=n_terms)
+
+    if method == "count":
+        score = counts.astype(float)
+    elif method == "docs":
+        score = docs.astype(float)
+    else:
+        # TF 以評論長度正規化，長評論不會因為字多就主導排名
+        tf = np.bincount(cols, weights=1.0 / lengths[rows], minlength=n_terms)
+        score = tf * idf(docs, n_docs)
+    score[docs < min_docs] = 0.0
+
+    return [
+        {"keyword": terms[i], "count": int(counts[i]), "docs": int(docs[i]),
+         "score": round(float(score[i]), 4)}
+        for i in top_indices(score, top_n)
+    ]
+
+
+@dataclass
+class KeywordStats:
+    """
+    keyword_stats 的結果：records 是 [{keyword, count, docs, score}]，timing 是耗時統計。
+    模板直接用 records；需要 DataFrame 時再呼叫 to_dataframe()（才會 import pandas）。
+    """
+    records: list = field(default_factory=list)
+    timing: dict = field(default_factory=dict)
+
+    def to_dict(self, orient="records"):
+        # 與舊版 DataFrame.to_dict(orient="records") 相容
+        if orient != "records":
+            raise ValueError("KeywordStats 只支援 orient='records'，其他格式請用 to_dataframe()")
+        return [dict(r) for r in self.records]
+
+    def to_dataframe(self):
+        import pandas as pd
+        df = pd.DataFrame(self.records, columns=['keyword', 'count', 'docs', 'score'])
+        df.attrs["timing"] = dict(self.timing)
+        return df
+
+
+def keyword_stats(texts, top_n=20, method=None, max_ngram=None):
+    """
+    不經資料庫、直接對一批原文算 Top N 關鍵字，回傳 KeywordStats（舊版回傳 DataFrame 的介面，
+    backup_code/ 裡的腳本還在用）。app 走 review_store 的每年詞頻表（refresh_keyword_counts +
+    top_keywords），兩邊共用 doc_terms / rank_keywords，排名規則一致。
+    """
+    t0 = time.perf_counter()
+    # 逐篇分詞，去停用詞並加上詞組
+    docs = segment(texts)
+    stopwords = get_stopwords()
+    docs_terms = [doc_terms(words, max_ngram, stopwords) for words in docs]
+    t1 = time.perf_counter()
+    # 詞組至少要在兩則評論出現才算，避免單篇評論的長句霸榜
+    ranked = rank_keywords(docs_terms, top_n=top_n, method=method,
+                           min_docs=2 if len(docs) > 1 else 1)
+    return KeywordStats(ranked, {
+        "documents": len(docs),
+        "segment_seconds": round(t1 - t0, 3),
+        "count_seconds": round(time.perf_counter() - t1, 3),
+    })
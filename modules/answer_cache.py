@@ -0,0 +1,135 @@
+# modules/answer_cache.py
+"""
+/ask 的回答快取：同一份評論（corpus hash）+ 正規化後的問題 + 模型與參數 → 回答。
+常見問題（「主要優缺點是什麼」）第二次問就直接回傳，不再呼叫付費 API。
+
+ANSWER_CACHE_SIMILARITY 設成 0~1 之間的門檻（例如 0.85）可開啟近似比對：
+同一份評論下，問題的字元二連詞 Jaccard 相似度達到門檻也算命中。
+"""
+
+import os, json, hashlib, threading, unicodedata
+from modules.result_cache import ResultCache
+
+# 提示詞或上下文組法改了就換版本號，舊回答自然失效
+ANSWER_PROMPT_VERSION = "2"
+
+
+def corpus_hash(reviews):
+    """整份評論的指紋（review_id + 內容），評論有增減或修改就會不同"""
+    h = hashlib.sha256()
+    for r in reviews:
+        h.update(json.dumps([r.get("review_id"), r.get("rating"), r.get("text")],
+                            ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+def normalize_question(question):
+    """全形轉半形、轉小寫、去掉空白與標點：「主要優缺點是什麼？」與「主要優缺點是什麼」視為同一題"""
+    q = unicodedata.normalize("NFKC", question).lower()
+    return "".join(c for c in q if unicodedata.category(c)[0] not in "PZSC")
+
+
+def _bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def similarity(a, b):
+    """字元二連詞的 Jaccard 相似度（中文不用分詞就能比）"""
+    x, y = _bigrams(a), _bigrams(b)
+    return len(x & y) / len(x | y) if x or y else 1.0
+
+
+class AnswerCache:
+    """
+    store 是 ResultCache（記憶體 LRU + 可選 SQLite，都有 ttl）。
+    每份評論另外記一份「問過哪些問題」的清單，近似比對只在同一份評論裡找。
+    """
+
+    def __init__(self, store, similarity_threshold=0.0, max_questions=50):
+        self.store = store
+        self.similarity_threshold = similarity_threshold
+        self.max_questions = max_questions
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(corpus, normalized, params):
+        return ["answer", corpus, normalized, ANSWER_PROMPT_VERSION,
+                sorted(params.items())]
+
+    def get(self, corpus, question, record=True, **params):
+        """
+        回傳 (value, match)，match 是 "exact" / "similar"；沒命中回傳 (None, None)。
+        record=False 不計入命中率（同一個問題的第二次查詢，例如 /ask 之後的 /ask/stream）。
+        """
+        normalized = normalize_question(question)
+        value = self.store.get(self._key(corpus, normalized, params))
+        if value is not None:
+            if record:
+                with self._lock:
+                    self.exact_hits += 1
+            return value, "exact"
+
+        if self.similarity_threshold > 0:
+            asked = self.store.get(["questions", corpus]) or []
+            best = max(asked, key=lambda q: similarity(normalized, q), default=None)
+            if best is not None and similarity(normalized, best) >= self.similarity_threshold:
+                value = self.store.get(self._key(corpus, best, params))
+                if value is not None:
+                    if record:
+                        with self._lock:
+                            self.similar_hits += 1
+                    return value, "similar"
+
+        if record:
+            with self._lock:
+                self.misses += 1
+        return None, None
+
+    def set(self, corpus, question, value, **params):
+        normalized = normalize_question(question)
+        self.store.set(self._key(corpus, normalized, params), value)
+        if self.similarity_threshold > 0:
+            asked = [q for q in (self.store.get(["questions", corpus]) or []) if q != normalized]
+            self.store.set(["questions", corpus], (asked + [normalized])[-self.max_questions:])
+
+    def stats(self):
+        with self._lock:
+            total = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.similar_hits) / total if total else 0.0,
+                "similarity_threshold": self.similarity_threshold,
+                "store": self.store.stats(),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    每個 process 共用一個回答快取，由環境變數設定：
+    ANSWER_CACHE_TTL（秒）、ANSWER_CACHE_SIZE（記憶體筆數）、
+    ANSWER_CACHE_DB（SQLite 路徑，未設定時沿用 RESULT_CACHE_DB）、
+    ANSWER_CACHE_SIMILARITY（近似比對門檻，0 = 只比對完全相同的問題）
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            store = ResultCache(
+                ttl=int(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600))),
+                max_items=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+                db_path=os.getenv("ANSWER_CACHE_DB") or os.getenv("RESULT_CACHE_DB") or None,
+                max_disk_items=int(os.getenv("ANSWER_CACHE_DISK_SIZE", "5000")),
+                table="answer_cache",
+            )
+            _cache = AnswerCache(
+                store, similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+            )
+        return _cache
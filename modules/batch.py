@@ -0,0 +1,166 @@
+# modules/batch.py
+"""
+多家店一次爬：
+
+    python -m modules.batch urls.txt --workers 3 --output reviews.jsonl
+    python -m modules.batch urls.txt --format sqlite --start-year 2024 --end-year 2025
+
+urls.txt 每行一個 Google Maps 店家網址（# 開頭為註解），也可以是 JSON 陣列。
+"""
+
+import os, sys, json, time, argparse, threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.driver_pool import DriverPool
+from modules.scraper_selenium import init_driver, fetch_google_maps_reviews
+from modules.places import extract_place_id
+from modules.review_store import fetch_reviews_incremental
+
+
+class DomainRateLimiter:
+    """同一個網域兩次開頁之間至少間隔 min_interval 秒（跨 thread 共用）"""
+
+    def __init__(self, min_interval=2.0):
+        self.min_interval = min_interval
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        domain = urlparse(url).netloc
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next.get(domain, 0.0))
+            self._next[domain] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class JsonlWriter:
+    """一家店爬完就把它的評論 append 到 JSONL 檔，避免全部爬完才寫"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, place_url, place_id, reviews):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for r in reviews:
+                f.write(json.dumps(dict(r, place_id=place_id, place_url=place_url),
+                                   ensure_ascii=False) + "\n")
+
+
+def load_urls(path):
+    """讀網址清單：JSON 陣列或一行一個網址"""
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        return [u.strip() for u in json.loads(content) if u.strip()]
+    return [line.strip() for line in content.splitlines()
+            if line.strip() and not line.strip().startswith("#")]
+
+
+def run_batch(urls, workers=2, fmt="jsonl", output="reviews.jsonl",
+              start_year=None, end_year=None, retries=2, min_interval=2.0,
+              scroll_times=60, progress=None, pool=None):
+    """
+    用 workers 個瀏覽器同時爬 urls，每家店爬完立刻寫出：
+    fmt="jsonl" 寫到 output；fmt="sqlite" 寫進 modules.review_store（可增量更新）。
+    失敗會以指數退避重試 retries 次。回傳整體統計。
+    pool 有給（例如 web app 的 get_driver_pool()）就從它借瀏覽器、用完不關；
+    沒給（CLI）才自己開一個 workers 大小的 pool。
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = DriverPool(init_driver, size=workers)
+    limiter = DomainRateLimiter(min_interval)
+    writer = JsonlWriter(output) if fmt == "jsonl" else None
+    lock = threading.Lock()
+    summary = {"places": len(urls), "done": 0, "failed": 0, "reviews": 0, "errors": {}}
+    started = time.time()
+
+    def scrape(url):
+        place_id = extract_place_id(url)
+        if not place_id:
+            # 拿網址當 place_id 會在資料庫留下一筆以網址為鍵、之後永遠對不上的店家
+            raise ValueError("無法從網址抽出 place_id，請確認格式")
+        for attempt in range(retries + 1):
+            limiter.wait(url)
+            try:
+                kwargs = dict(start_year=start_year, end_year=end_year, pool=pool,
+                              scroll_times=scroll_times, debug=False)
+                if fmt == "sqlite":
+                    reviews = fetch_reviews_incremental(place_id, url, **kwargs)
+                else:
+                    reviews = fetch_google_maps_reviews(url, **kwargs)
+                    writer.write(url, place_id, reviews)
+                return len(reviews)
+            except ValueError:
+                raise
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                wait = 2 ** (attempt + 1)
+                print(f"⚠️ {url} 失敗（{e}），{wait}s 後重試 #{attempt + 1}")
+                time.sleep(wait)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(scrape, url): url for url in urls}
+            for fut in as_completed(futures):
+                url = futures[fut]
+                with lock:
+                    try:
+                        summary["reviews"] += fut.result()
+                        summary["done"] += 1
+                    except Exception as e:
+                        summary["failed"] += 1
+                        summary["errors"][url] = str(e)
+                    if progress:
+                        progress(done=summary["done"], failed=summary["failed"],
+                                 places=summary["places"], reviews_found=summary["reviews"])
+    finally:
+        if own_pool:
+            pool.close()
+
+    elapsed = time.time() - started
+    summary["seconds"] = round(elapsed, 1)
+    summary["places_per_min"] = round(summary["done"] / elapsed * 60, 2) if elapsed else 0.0
+    summary["reviews_per_sec"] = round(summary["reviews"] / elapsed, 2) if elapsed else 0.0
+    if progress:
+        progress(summary=summary)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批次爬取多家店的 Google Maps 評論")
+    parser.add_argument("urls", help="網址清單檔（一行一個，或 JSON 陣列）")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("DRIVER_POOL_SIZE", "2")),
+                        help="同時開幾個瀏覽器")
+    parser.add_argument("--format", choices=["jsonl", "sqlite"], default="jsonl")
+    parser.add_argument("--output", default="reviews.jsonl", help="JSONL 輸出檔")
+    parser.add_argument("--start-year", type=int)
+    parser.add_argument("--end-year", type=int)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--min-interval", type=float, default=2.0,
+                        help="同一網域兩次開頁的最小間隔（秒）")
+    parser.add_argument("--scroll-times", type=int, default=60)
+    args = parser.parse_args(argv)
+
+    urls = load_urls(args.urls)
+
+    def show(**p):
+        if "summary" in p:
+            return
+        print(f"[{p['done'] + p['failed']}/{p['places']}] 累計 {p['reviews_found']} 筆評論")
+
+    summary = run_batch(
+        urls, workers=args.workers, fmt=args.format, output=args.output,
+        start_year=args.start_year, end_year=args.end_year, retries=args.retries,
+        min_interval=args.min_interval, scroll_times=args.scroll_times, progress=show
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
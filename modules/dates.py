@@ -0,0 +1,161 @@
+# modules/dates.py
+"""
+把評論卡片上的時間文字轉成日期，zh-TW 與英文介面都支援：
+
+    「3 個月前」「1 年前」「2 週前」「昨天」「3 個月前 (已編輯)」
+    "3 months ago" "a year ago" "Edited 2 weeks ago" "yesterday"
+    「2019年5月」「2019/05/12」"May 2019"（絕對日期）
+
+- 所有 pattern 預先編譯
+- 每次爬取建立一個 TimeTextParser：整批卡片用同一個參考時間，不會每張卡片各自 now()，
+  跨過午夜也不會前後不一致
+- 同一個字串只解析一次（一間店的卡片通常只有十幾種不同的時間文字）
+- 回傳的 precision 說明日期有多準：「1 年前」只知道是哪一年左右，不該當成精確到日
+"""
+
+import re, datetime
+from dataclasses import dataclass
+from dateutil.relativedelta import relativedelta
+
+# 精確度，由細到粗；unknown 表示看不懂，日期用參考時間當天
+DAY, WEEK, MONTH, YEAR, UNKNOWN = "day", "week", "month", "year", "unknown"
+# 各精確度的誤差範圍：「1 年前」實際上可能是算出來的日期之後一年內的任何一天
+PRECISION_SPANS = {DAY: relativedelta(days=1), WEEK: relativedelta(weeks=1),
+                   MONTH: relativedelta(months=1), YEAR: relativedelta(years=1),
+                   UNKNOWN: relativedelta()}
+
+ZH_DIGITS = {"一": 1, "兩": 2, "二": 2, "三": 3, "四": 4, "五": 5,
+             "六": 6, "七": 7, "八": 8, "九": 9}
+EN_NUMBERS = {"a": 1, "an": 1, "one": 1}
+
+# 單位 → (relativedelta 參數, 精確度)
+UNITS = {
+    "年": ("years", YEAR), "year": ("years", YEAR),
+    "個月": ("months", MONTH), "月": ("months", MONTH), "month": ("months", MONTH),
+    "週": ("weeks", WEEK), "周": ("weeks", WEEK), "星期": ("weeks", WEEK), "week": ("weeks", WEEK),
+    "天": ("days", DAY), "日": ("days", DAY), "day": ("days", DAY),
+    "小時": ("hours", DAY), "hour": ("hours", DAY),
+    "分鐘": ("minutes", DAY), "minute": ("minutes", DAY),
+    "秒": ("seconds", DAY), "second": ("seconds", DAY),
+}
+# 沒有數字的說法 → 幾天前
+RELATIVE_WORDS = {"今天": 0, "剛剛": 0, "昨天": 1, "前天": 2,
+                  "today": 0, "just now": 0, "yesterday": 1}
+EN_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+
+ZH_RELATIVE_RE = re.compile(
+    r"(\d+|[一兩二三四五六七八九]?十[一二三四五六七八九]?|[一兩二三四五六七八九])\s*"
+    r"(年|個月|月|週|周|星期|天|日|小時|分鐘|秒)\s*前")
+EN_RELATIVE_RE = re.compile(
+    r"\b(\d+|an?|one)\s+(year|month|week|day|hour|minute|second)s?\s+ago\b", re.IGNORECASE)
+WORD_RE = re.compile(r"今天|剛剛|昨天|前天|\b(?:today|just now|yesterday)\b", re.IGNORECASE)
+# 2019年5月12日、2019/05/12、2019-05、2019.5
+YMD_RE = re.compile(r"(\d{4})\s*(?:年|[/.\-])\s*(\d{1,2})(?:\s*(?:月|[/.\-])\s*(\d{1,2}))?")
+# May 12, 2019、Sep 2019
+EN_DATE_RE = re.compile(r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+"
+                        r"(?:(\d{1,2}),?\s+)?(\d{4})\b", re.IGNORECASE)
+YEAR_RE = re.compile(r"(?<!\d)(\d{4})(?!\d)")
+EDITED_RE = re.compile(r"已編輯|已编辑|\bedited\b", re.IGNORECASE)
+
+
+def zh_number(n):
+    """阿拉伯數字或 99 以內的中文數字：「3」「十一」「二十」「兩」"""
+    if n.isdigit():
+        return int(n)
+    if "十" not in n:
+        return ZH_DIGITS[n]
+    tens, _, ones = n.partition("十")
+    return ZH_DIGITS.get(tens, 1) * 10 + ZH_DIGITS.get(ones, 0)
+
+
+@dataclass(frozen=True)
+class ParsedDate:
+    date: datetime.date
+    precision: str
+    edited: bool = False
+
+    def latest(self):
+        """這段時間文字最晚可能是哪一天：判斷「一定早於某天」時要用它，不能只看 date"""
+        return self.date + PRECISION_SPANS[self.precision]
+
+
+class TimeTextParser:
+    """
+    now 是參考時間（預設為建立當下），同一個 parser 的所有結果都以它為準。
+    解析結果依原字串快取在 parser 上，每次爬取用新的 parser，快取不會無限累積。
+    """
+
+    def __init__(self, now=None):
+        self.now = now or datetime.datetime.now()
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, time_txt):
+        """只要日期時的簡寫：parser(time_txt) → datetime.date"""
+        return self.parse(time_txt).date
+
+    def parse(self, time_txt):
+        time_txt = time_txt or ""
+        parsed = self._cache.get(time_txt)
+        if parsed is not None:
+            self.hits += 1
+            return parsed
+        self.misses += 1
+        parsed = self._parse(time_txt)
+        self._cache[time_txt] = parsed
+        return parsed
+
+    def _ago(self, amount, unit):
+        field, precision = UNITS[unit]
+        return (self.now - relativedelta(**{field: amount})).date(), precision
+
+    def _parse(self, time_txt):
+        edited = bool(EDITED_RE.search(time_txt))
+
+        m = ZH_RELATIVE_RE.search(time_txt)
+        if m:
+            date, precision = self._ago(zh_number(m.group(1)), m.group(2))
+            return ParsedDate(date, precision, edited)
+
+        m = EN_RELATIVE_RE.search(time_txt)
+        if m:
+            n = m.group(1).lower()
+            date, precision = self._ago(int(n) if n.isdigit() else EN_NUMBERS[n],
+                                        m.group(2).lower())
+            return ParsedDate(date, precision, edited)
+
+        m = WORD_RE.search(time_txt)
+        if m:
+            days = RELATIVE_WORDS[m.group().lower()]
+            return ParsedDate((self.now - datetime.timedelta(days=days)).date(), DAY, edited)
+
+        m = YMD_RE.search(time_txt)
+        if m:
+            parsed = _absolute(int(m.group(1)), int(m.group(2)),
+                               int(m.group(3)) if m.group(3) else None, edited)
+            if parsed:
+                return parsed
+
+        m = EN_DATE_RE.search(time_txt)
+        if m:
+            parsed = _absolute(int(m.group(3)), EN_MONTHS[m.group(1).lower()],
+                               int(m.group(2)) if m.group(2) else None, edited)
+            if parsed:
+                return parsed
+
+        m = YEAR_RE.search(time_txt)
+        if m:
+            return ParsedDate(datetime.date(int(m.group(1)), 1, 1), YEAR, edited)
+        return ParsedDate(self.now.date(), UNKNOWN, edited)
+
+
+def _absolute(year, month, day, edited):
+    """年月（日）組成日期；月份或日期不合法回傳 None，交給下一個 pattern"""
+    try:
+        if day is None:
+            return ParsedDate(datetime.date(year, month, 1), MONTH, edited)
+        return ParsedDate(datetime.date(year, month, day), DAY, edited)
+    except ValueError:
+        return None
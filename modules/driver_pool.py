@@ -0,0 +1,213 @@
+# modules/driver_pool.py
+
+import os, threading, time, atexit
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_tree_rss_mb(pid):
+    """
+    pid 與所有子孫 process 的 RSS 加總（MB），直接讀 /proc，不用另外裝 psutil。
+    不是 Linux 或 pid 不存在時回傳 None。共用的記憶體會重複計算，只適合拿來和自己的基準比。
+    """
+    try:
+        entries = [e for e in os.listdir("/proc") if e.isdigit()]
+    except OSError:
+        return None
+    children = defaultdict(list)
+    for entry in entries:
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # comm 可能含空白或括號，從最後一個 ")" 之後切：state ppid ...
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children[ppid].append(int(entry))
+    total, found, stack = 0, False, [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+            found = True
+        except (OSError, ValueError, IndexError):
+            continue
+        stack.extend(children.get(p, ()))
+    return total / (1024 * 1024) if found else None
+
+
+class PooledDriver:
+    """包一層 webdriver，記錄使用次數與初始記憶體，方便決定何時回收"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.time()
+        self.baseline_rss = None
+
+    def rss_mb(self):
+        """
+        chromedriver 與它開的整個 Chromium（browser、renderer、GPU …）的 RSS 加總；
+        JS heap 只看得到目前頁面，Maps 換成 about:blank 後就歸零，量不到瀏覽器本身的累積。
+        拿不到 chromedriver 的 pid 或不是 Linux 時回傳 None。
+        """
+        try:
+            pid = self.driver.service.process.pid
+        except AttributeError:
+            return None
+        return process_tree_rss_mb(pid)
+
+    def is_alive(self):
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class DriverPool:
+    """
+    有上限的 headless Chromium 連線池。
+    - checkout()/checkin() 借出與歸還；也可用 with pool.driver() as d:
+    - 借出前做健康檢查，壞掉的直接丟掉重開
+    - 使用超過 max_uses 次，或回到 about:blank 後整個瀏覽器的 RSS 比剛開時多出 max_rss_growth_mb，就回收
+    - remote-debugging-port 交給 Chromium 自己挑（0），同時啟動多個也不會搶同一個 port
+    """
+
+    def __init__(self, factory, size=2, max_uses=20, max_rss_growth_mb=500,
+                 checkout_timeout=120):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_growth_mb = max_rss_growth_mb
+        self.checkout_timeout = checkout_timeout
+        self._idle = deque()
+        self._total = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _create(self):
+        pooled = PooledDriver(self.factory(debug_port=0))
+        # 剛開的瀏覽器停在空白頁，這時的 RSS 當基準
+        pooled.baseline_rss = pooled.rss_mb()
+        return pooled
+
+    def _discard(self, pooled):
+        pooled.quit()
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def _memory_grew(self, pooled):
+        """
+        已經回到 about:blank 時讀 RSS 與基準比：量的是多次使用累積下來沒釋放的部分，
+        而不是 Maps 頁面本身有多大（在 Maps 頁面上讀，每個載過地圖的 driver 都會被回收）
+        """
+        if not self.max_rss_growth_mb or pooled.baseline_rss is None:
+            return False
+        rss = pooled.rss_mb()
+        return rss is not None and rss - pooled.baseline_rss > self.max_rss_growth_mb
+
+    def checkout(self):
+        deadline = time.time() + self.checkout_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("DriverPool 已關閉")
+                if self._idle:
+                    # 後進先出：最近用過的 driver 最「熱」
+                    pooled = self._idle.pop()
+                    create = False
+                elif self._total < self.size:
+                    self._total += 1
+                    pooled = None
+                    create = True
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError("等待可用的瀏覽器逾時")
+                    self._cond.wait(remaining)
+                    continue
+
+            if create:
+                try:
+                    return self._create()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+
+            if pooled.is_alive():
+                return pooled
+            # 健康檢查失敗：丟掉，下一輪重新借
+            self._discard(pooled)
+
+    def checkin(self, pooled, broken=False):
+        pooled.uses += 1
+        if broken or self._closed or pooled.uses >= self.max_uses:
+            self._discard(pooled)
+            return
+        try:
+            # 清掉目前頁面，釋放 Maps 佔用的記憶體
+            pooled.driver.get("about:blank")
+        except Exception:
+            self._discard(pooled)
+            return
+        if self._memory_grew(pooled):
+            self._discard(pooled)
+            return
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def driver(self):
+        pooled = self.checkout()
+        broken = False
+        try:
+            yield pooled.driver
+        except Exception:
+            # 例外發生時 driver 狀態不可信，直接回收
+            broken = True
+            raise
+        finally:
+            self.checkin(pooled, broken=broken)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self.size, "total": self._total, "idle": len(self._idle)}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool(factory):
+    """每個 process 共用一個 pool，大小由環境變數 DRIVER_POOL_SIZE 等控制"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool(
+                factory,
+                size=int(os.getenv("DRIVER_POOL_SIZE", "2")),
+                max_uses=int(os.getenv("DRIVER_MAX_USES", "20")),
+                max_rss_growth_mb=int(os.getenv("DRIVER_MAX_RSS_GROWTH_MB", "500")),
+            )
+            atexit.register(_pool.close)
+        return _pool
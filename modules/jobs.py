@@ -0,0 +1,142 @@
+# modules/jobs.py
+
+import os, time, uuid, asyncio, threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """一個背景爬蟲 + 分析工作；progress 會在執行中不斷更新"""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"      # queued / running / done / error
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.version = 0            # 每次狀態改變 +1，SSE 用來判斷要不要推送
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    有上限的背景工作池：
+    - submit() 立即回傳 Job，實際工作交給 ThreadPoolExecutor
+    - 同一個 key（place_id + 年份）還在跑時，直接回傳原本那個 Job，不重複爬
+    - 完成的 Job 保留 ttl 秒，讓使用者還能拿結果
+    """
+
+    def __init__(self, max_workers=2, ttl=3600):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="scrape-job")
+        self._jobs = {}
+        self._inflight = {}
+        self._cond = threading.Condition()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        fn 會以 fn(*args, progress=callback, **kwargs) 被呼叫，
+        callback(**fields) 可隨時回報進度。
+        """
+        with self._cond:
+            self._evict()
+            job_id = self._inflight.get(key)
+            if job_id in self._jobs:
+                return self._jobs[job_id]
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._inflight[key] = job.id
+
+        def progress(**fields):
+            self._update(job, progress=fields)
+
+        def run():
+            self._update(job, status="running")
+            try:
+                result = fn(*args, progress=progress, **kwargs)
+            except Exception as e:
+                self._finish(job, error=e)
+            else:
+                self._finish(job, result=result)
+
+        self._executor.submit(run)
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait_for_change(self, job, version, timeout=15):
+        """阻塞到 job.version 改變或逾時，回傳最新的 version"""
+        with self._cond:
+            self._cond.wait_for(lambda: job.version != version, timeout=timeout)
+            return job.version
+
+    async def wait_for_change_async(self, job, version, timeout=15, interval=0.25):
+        """
+        wait_for_change 的 asyncio 版：不佔 thread，每 interval 秒看一次 job.version
+        （只讀一個 int，不需要拿鎖），給 asgi.py 的 SSE 用。
+        """
+        deadline = time.time() + timeout
+        while job.version == version and time.time() < deadline:
+            await asyncio.sleep(interval)
+        return job.version
+
+    def _update(self, job, status=None, progress=None):
+        with self._cond:
+            if status:
+                job.status = status
+            if progress:
+                job.progress.update(progress)
+            job.version += 1
+            self._cond.notify_all()
+
+    def _finish(self, job, result=None, error=None):
+        with self._cond:
+            if error is not None:
+                job.status = "error"
+                job.error = str(error)
+                job.exception = error
+            else:
+                job.status = "done"
+                job.result = result
+            job.finished_at = time.time()
+            job.version += 1
+            if self._inflight.get(job.key) == job.id:
+                del self._inflight[job.key]
+            self._cond.notify_all()
+
+    def _evict(self):
+        now = time.time()
+        expired = [jid for jid, j in self._jobs.items()
+                   if j.finished_at and now - j.finished_at > self.ttl]
+        for jid in expired:
+            del self._jobs[jid]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """每個 process 共用一個 JobManager，worker 數由 SCRAPE_JOB_WORKERS 控制"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(
+                max_workers=int(os.getenv("SCRAPE_JOB_WORKERS",
+                                          os.getenv("DRIVER_POOL_SIZE", "2"))),
+                ttl=int(os.getenv("SCRAPE_JOB_TTL", "3600")),
+            )
+        return _manager
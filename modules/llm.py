@@ -0,0 +1,187 @@
+# modules/llm.py
+"""
+OpenRouter 呼叫與 token 計算。openai / tiktoken 都在第一次用到時才載入。
+所有呼叫都經過 modules/rate_limit.py 的共用限速與重試。
+"""
+
+import os, re, threading
+from modules.rate_limit import INTERACTIVE, get_rate_limiter
+
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek/deepseek-r1-0528")
+# 送給 tiktoken 的編碼；DeepSeek 沒有公開的 tiktoken 編碼，用 cl100k_base 估算即可
+TOKEN_ENCODING = os.getenv("LLM_TOKEN_ENCODING", "cl100k_base")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+_encoding = None
+
+
+def get_router_client():
+    """第一次用到才建立 OpenRouter client（thread-safe，可在多個 thread 共用）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(
+                base_url="https://openrouter.ai/api/v1",
+                api_key=os.getenv("OPENROUTER_API_KEY"),
+                # 重試交給 rate_limit（會看 Retry-After 並讓所有 worker 一起退避），client 本身不重試
+                max_retries=0
+            )
+        return _client
+
+
+def get_async_router_client():
+    """asyncio 版的 OpenRouter client，給 asgi.py 的串流端點用"""
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            from openai import AsyncOpenAI
+            _async_client = AsyncOpenAI(
+                base_url="https://openrouter.ai/api/v1",
+                api_key=os.getenv("OPENROUTER_API_KEY"),
+                max_retries=0
+            )
+        return _async_client
+
+
+def count_tokens(text):
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+        _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+    return len(_encoding.encode(text or "", disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """超過 max_tokens 的文字截斷（單則超長評論不會把整個 chunk 撐爆）"""
+    count_tokens("")
+    ids = _encoding.encode(text or "", disallowed_special=())
+    if len(ids) <= max_tokens:
+        return text
+    return _encoding.decode(ids[:max_tokens])
+
+
+def chat(messages, max_tokens=2000, temperature=0.7, model=None, priority=INTERACTIVE):
+    """
+    呼叫 chat completion，回傳原始 response（呼叫端自己看 finish_reason 等欄位）。
+    priority：使用者正在等的用 INTERACTIVE，背景摘要用 BACKGROUND。
+    """
+    return get_rate_limiter().call(
+        lambda: get_router_client().chat.completions.create(
+            model=model or LLM_MODEL,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            extra_headers={},
+            extra_body={}
+        ),
+        priority=priority, max_retries=LLM_MAX_RETRIES
+    )
+
+
+def chat_stream(messages, max_tokens=2000, temperature=0.7, model=None, priority=INTERACTIVE):
+    """
+    stream=True 版本的 chat，逐段 yield (kind, text, finish_reason)：
+    kind 是 "content"（回答）或 "reasoning"（推理模型的思考過程，通常只用來顯示「思考中」）。
+    限速與重試只包在建立串流的那一次呼叫；開始傳回內容之後中斷就直接丟錯。
+    """
+    stream = get_rate_limiter().call(
+        lambda: get_router_client().chat.completions.create(
+            model=model or LLM_MODEL,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            extra_headers={},
+            extra_body={}
+        ),
+        priority=priority, max_retries=LLM_MAX_RETRIES
+    )
+    try:
+        for chunk in stream:
+            yield from _stream_parts(chunk)
+    finally:
+        # 使用者關掉頁面時提早結束，連線跟著關閉，不再繼續付費產生 token
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+
+
+def _stream_parts(chunk):
+    """把一個串流 chunk 拆成 [(kind, text, finish_reason)]，chat_stream / achat_stream 共用"""
+    if not chunk.choices:
+        return []
+    choice = chunk.choices[0]
+    delta = choice.delta
+    parts = []
+    reasoning = getattr(delta, "reasoning", None) if delta else None
+    if reasoning:
+        parts.append(("reasoning", reasoning, None))
+    text = (delta.content or "") if delta else ""
+    if text or choice.finish_reason:
+        parts.append(("content", text, choice.finish_reason))
+    return parts
+
+
+async def achat_stream(messages, max_tokens=2000, temperature=0.7, model=None,
+                       priority=INTERACTIVE):
+    """chat_stream 的 asyncio 版（AsyncOpenAI），等待上游時不佔 thread"""
+    client = get_async_router_client()
+    stream = await get_rate_limiter().call_async(
+        lambda: client.chat.completions.create(
+            model=model or LLM_MODEL,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            extra_headers={},
+            extra_body={}
+        ),
+        priority=priority, max_retries=LLM_MAX_RETRIES
+    )
+    try:
+        async for chunk in stream:
+            for part in _stream_parts(chunk):
+                yield part
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            await close()
+
+
+BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+
+
+def normalize_breaks(text):
+    """把模型回傳中的 <br> 標籤換成換行"""
+    return BR_RE.sub("\n", text)
+
+
+class BreakNormalizer:
+    """
+    串流版的 normalize_breaks：<br> 可能被切在兩段之間（例如 "<b" + "r>"），
+    結尾看起來像沒寫完的標籤就先留著，等下一段再一起換。開頭的空白也一併去掉。
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.started = False
+
+    def feed(self, text):
+        self.buf += text
+        if not self.started:
+            self.buf = self.buf.lstrip()
+            self.started = bool(self.buf)
+        i = self.buf.rfind("<")
+        if i != -1 and ">" not in self.buf[i:] and len(self.buf) - i < 16:
+            out, self.buf = self.buf[:i], self.buf[i:]
+        else:
+            out, self.buf = self.buf, ""
+        return normalize_breaks(out)
+
+    def flush(self):
+        out, self.buf = self.buf.rstrip(), ""
+        return normalize_breaks(out)
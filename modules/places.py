@@ -0,0 +1,9 @@
+# modules/places.py
+# 不依賴 selenium 的店家網址小工具，讓 app.py 不用為了抽 place_id 載入整個爬蟲
+
+import re
+
+
+def extract_place_id(url):
+    m = re.search(r"/place/([^/?]+)", url)
+    return m.group(1) if m else None
@@ -0,0 +1,317 @@
+# modules/rate_limit.py
+"""
+OpenRouter 呼叫的限速與重試，所有 gunicorn worker 共用同一個 token bucket：
+
+- 桶子的狀態放在 SQLite 檔（BEGIN IMMEDIATE 鎖住整個檔案），不需要 Redis 之類的外部服務
+- 同一個 process 裡的等待者排成 priority queue：使用者正在等的提問（INTERACTIVE）
+  先拿，map-reduce 摘要之類的背景呼叫（BACKGROUND）排後面，而且要保留一部分額度給互動請求
+- 429 / 5xx / 連線錯誤會依 Retry-After（沒有就指數退避 + jitter）重試；
+  收到 429 時整個桶子暫停，其他 worker 也一起等，不會繼續撞限制
+"""
+
+import os, time, heapq, random, sqlite3, asyncio, tempfile, threading, itertools
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+
+class RateLimitTimeout(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """
+    每秒補 rate 個、最多存 capacity 個的 token bucket。
+    db_path 有設就把狀態存在 SQLite，多個 process 共用；沒設就只在本 process 有效。
+    """
+
+    def __init__(self, rate, capacity, db_path=None, name="openrouter"):
+        self.rate = rate
+        self.capacity = capacity
+        self.db_path = db_path
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = (float(capacity), time.time(), 0.0)
+        if db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                    " name TEXT PRIMARY KEY, tokens REAL NOT NULL,"
+                    " updated_at REAL NOT NULL, paused_until REAL NOT NULL)"
+                )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """取出 (tokens, updated_at, paused_until)，yield 一個 list，結束時把改過的值寫回"""
+        if not self.db_path:
+            with self._lock:
+                state = list(self._state)
+                yield state
+                self._state = tuple(state)
+            return
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE 直接拿寫入鎖，讀 → 算 → 寫之間不會被別的 worker 插隊
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT tokens, updated_at, paused_until FROM rate_limit_buckets"
+                    " WHERE name = ?", (self.name,)
+                ).fetchone()
+                state = list(row) if row else [float(self.capacity), time.time(), 0.0]
+                yield state
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets"
+                    " (name, tokens, updated_at, paused_until) VALUES (?, ?, ?, ?)",
+                    (self.name, *state)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def try_acquire(self, n=1, reserve=0.0):
+        """
+        拿 n 個 token，成功回傳 0；不夠就回傳大概還要等幾秒。
+        reserve 是拿完之後至少要留在桶子裡的量（背景呼叫用，保留額度給互動請求）。
+        """
+        with self._transaction() as state:
+            # 拿到鎖之後才讀時間：等鎖期間別的 process 寫入的 updated_at 可能比進來時的 now 還晚
+            now = time.time()
+            tokens, updated_at, paused_until = state
+            if now < paused_until:
+                return paused_until - now
+            tokens = min(self.capacity, tokens + max(now - updated_at, 0.0) * self.rate)
+            if tokens - n >= reserve:
+                state[:] = [tokens - n, now, paused_until]
+                return 0.0
+            state[:] = [tokens, now, paused_until]
+            return (n + reserve - tokens) / self.rate
+
+    def pause(self, seconds):
+        """上游回 429 時呼叫：所有共用這個桶子的 worker 在 seconds 秒內都不發送，且清空 token"""
+        until = time.time() + seconds
+        with self._transaction() as state:
+            state[0] = 0.0
+            state[1] = until
+            state[2] = max(state[2], until)
+
+
+class RateLimiter:
+    """
+    包住 TokenBucket，加上本 process 內的優先順序：只有排在 queue 最前面的人會去搶 token，
+    互動請求進來時會排到背景呼叫前面。
+    """
+
+    def __init__(self, bucket, background_reserve=0.0, max_wait=120.0):
+        self.bucket = bucket
+        self.background_reserve = background_reserve
+        self.max_wait = max_wait
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {name: {"calls": 0, "waited": 0, "wait_seconds": 0.0,
+                                "max_wait_seconds": 0.0, "timeouts": 0}
+                         for name in PRIORITY_NAMES.values()}
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    def acquire(self, priority=INTERACTIVE):
+        ticket = (priority, next(self._seq))
+        reserve = self.background_reserve if priority != INTERACTIVE else 0.0
+        t0 = time.time()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                with self._cond:
+                    while self._queue[0] != ticket:
+                        if not self._cond.wait(timeout=max(t0 + self.max_wait - time.time(), 0)):
+                            raise self._timeout(priority, t0)
+                wait = self.bucket.try_acquire(reserve=reserve)
+                if wait <= 0:
+                    break
+                if time.time() + wait > t0 + self.max_wait:
+                    raise self._timeout(priority, t0)
+                # 最多睡 1 秒就重新看一次 queue，讓後來的互動請求可以插到前面
+                time.sleep(min(wait, 1.0))
+        finally:
+            with self._cond:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+        self._record(priority, time.time() - t0)
+
+    def _timeout(self, priority, t0):
+        with self._metrics_lock:
+            self._metrics[PRIORITY_NAMES[priority]]["timeouts"] += 1
+        return RateLimitTimeout(f"AI 服務忙碌中（已排隊 {time.time() - t0:.0f} 秒），請稍後再試。")
+
+    def _record(self, priority, waited):
+        with self._metrics_lock:
+            m = self._metrics[PRIORITY_NAMES[priority]]
+            m["calls"] += 1
+            m["wait_seconds"] += waited
+            if waited > 0.05:
+                m["waited"] += 1
+            m["max_wait_seconds"] = max(m["max_wait_seconds"], waited)
+
+    async def acquire_async(self, priority=INTERACTIVE):
+        """
+        asyncio 版的 acquire：排隊與等 token 都用 asyncio.sleep，不佔 thread。
+        token bucket 是 SQLite 檔案（可能等檔案鎖），取 token 丟到 thread 執行，不卡 event loop。
+        """
+        ticket = (priority, next(self._seq))
+        reserve = self.background_reserve if priority != INTERACTIVE else 0.0
+        t0 = time.time()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                with self._cond:
+                    at_head = self._queue[0] == ticket
+                if at_head:
+                    wait = await asyncio.to_thread(self.bucket.try_acquire, reserve=reserve)
+                    if wait <= 0:
+                        break
+                else:
+                    wait = 0.05
+                if time.time() + wait > t0 + self.max_wait:
+                    raise self._timeout(priority, t0)
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            with self._cond:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+        self._record(priority, time.time() - t0)
+
+    def _retry_wait(self, e, attempt, max_retries):
+        """
+        呼叫失敗後決定要不要重試：不該重試（或次數用完）就把錯誤丟出去，
+        否則回傳呼叫端還要自己 sleep 的秒數（429 已經由 bucket.pause 讓下次 acquire 等待，回傳 0）。
+        """
+        status = getattr(e, "status_code", None)
+        if status not in RETRY_STATUS and type(e).__name__ not in RETRY_ERRORS:
+            raise e
+        wait = retry_after(e)
+        if status == 429:
+            with self._metrics_lock:
+                self.rate_limited += 1
+            # 上游說太快了：整個桶子暫停，其他 worker 也一起等
+            self.bucket.pause(wait if wait is not None else 2 ** attempt)
+        if attempt == max_retries:
+            with self._metrics_lock:
+                self.failures += 1
+            raise e
+        with self._metrics_lock:
+            self.retries += 1
+        if wait is None:
+            wait = min(2 ** attempt, 30) * (0.5 + random.random())
+        print(f"⚠️ AI 呼叫失敗（{status or type(e).__name__}），{wait:.1f}s 後重試 #{attempt + 1}")
+        return 0.0 if status == 429 else wait
+
+    def call(self, fn, priority=INTERACTIVE, max_retries=4):
+        """限速後呼叫 fn()；429 / 5xx / 連線錯誤依 Retry-After 或指數退避重試"""
+        for attempt in range(max_retries + 1):
+            self.acquire(priority)
+            try:
+                return fn()
+            except Exception as e:
+                time.sleep(self._retry_wait(e, attempt, max_retries))
+
+    async def call_async(self, fn, priority=INTERACTIVE, max_retries=4):
+        """call 的 asyncio 版，fn() 回傳 awaitable"""
+        for attempt in range(max_retries + 1):
+            await self.acquire_async(priority)
+            try:
+                return await fn()
+            except Exception as e:
+                await asyncio.sleep(self._retry_wait(e, attempt, max_retries))
+
+    def stats(self):
+        with self._metrics_lock:
+            per_priority = {}
+            for name, m in self._metrics.items():
+                per_priority[name] = dict(
+                    m,
+                    wait_seconds=round(m["wait_seconds"], 2),
+                    max_wait_seconds=round(m["max_wait_seconds"], 2),
+                    avg_wait_seconds=round(m["wait_seconds"] / m["calls"], 3) if m["calls"] else 0.0,
+                )
+            return {
+                "rate_per_sec": self.bucket.rate,
+                "burst": self.bucket.capacity,
+                "shared": bool(self.bucket.db_path),
+                "queued": len(self._queue),
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "priorities": per_priority,
+            }
+
+
+def retry_after(e):
+    """從錯誤的 response header 讀 Retry-After（秒數或 HTTP 日期，也支援 retry-after-ms）"""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    每個 process 一個 limiter，桶子狀態透過 SQLite 檔跨 worker 共用。環境變數：
+    LLM_RATE_PER_MIN（每分鐘呼叫數）、LLM_BURST（可瞬間連發幾次）、
+    LLM_RATE_DB（SQLite 路徑，預設在系統暫存目錄；設成空字串則只在本 process 限速）、
+    LLM_BACKGROUND_RESERVE（背景呼叫要保留給互動請求的比例）、LLM_MAX_WAIT（最多排隊秒數）
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            burst = float(os.getenv("LLM_BURST", "5"))
+            bucket = TokenBucket(
+                rate=float(os.getenv("LLM_RATE_PER_MIN", "20")) / 60.0,
+                capacity=burst,
+                db_path=os.getenv("LLM_RATE_DB",
+                                  os.path.join(tempfile.gettempdir(), "llm_rate_limit.db")) or None,
+            )
+            _limiter = RateLimiter(
+                bucket,
+                background_reserve=burst * float(os.getenv("LLM_BACKGROUND_RESERVE", "0.2")),
+                max_wait=float(os.getenv("LLM_MAX_WAIT", "120")),
+            )
+        return _limiter
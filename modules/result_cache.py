@@ -0,0 +1,149 @@
+# modules/result_cache.py
+
+import os, json, time, sqlite3, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class ResultCache:
+    """
+    分析結果快取，key 例如 (place_id, start_year, end_year)。
+    - 第一層：process 內的 LRU（OrderedDict），超過 max_items 就踢掉最久沒用的
+    - 第二層（可選）：SQLite 檔案，讓多個 gunicorn worker 共用
+    兩層都有 ttl，過期視同 miss。值必須可以 json 序列化。
+    table 是 SQLite 裡的表名，不同用途的快取可以共用同一個檔案。
+    """
+
+    def __init__(self, ttl=6 * 3600, max_items=128, db_path=None, max_disk_items=1000,
+                 table="result_cache"):
+        self.ttl = ttl
+        self.table = table
+        self.max_items = max_items
+        self.db_path = db_path
+        self.max_disk_items = max_disk_items
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        if db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                    " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def make_key(key):
+        return json.dumps(list(key) if isinstance(key, tuple) else key,
+                          ensure_ascii=False)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        k = self.make_key(key)
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(k)
+            if item is not None:
+                created_at, value = item
+                if now - created_at <= self.ttl:
+                    self._mem.move_to_end(k)
+                    self.hits += 1
+                    return value
+                del self._mem[k]
+
+        if self.db_path:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"SELECT value, created_at FROM {self.table} WHERE key = ?", (k,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl:
+                    conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                                 (now, k))
+                    value = json.loads(row[0])
+                    with self._lock:
+                        self._put_mem(k, row[1], value)
+                        self.disk_hits += 1
+                    return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        k = self.make_key(key)
+        now = time.time()
+        with self._lock:
+            self._put_mem(k, now, value)
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (k, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?",
+                             (now - self.ttl,))
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key NOT IN ("
+                    f" SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT ?)",
+                    (self.max_disk_items,)
+                )
+
+    def invalidate(self, key):
+        k = self.make_key(key)
+        with self._lock:
+            self._mem.pop(k, None)
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (k,))
+
+    def _put_mem(self, k, created_at, value):
+        self._mem[k] = (created_at, value)
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+                "items": len(self._mem),
+                "max_items": self.max_items,
+                "ttl": self.ttl,
+                "disk": bool(self.db_path),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    每個 process 共用一個快取，由環境變數設定：
+    RESULT_CACHE_TTL（秒）、RESULT_CACHE_SIZE（記憶體筆數）、
+    RESULT_CACHE_DB（SQLite 路徑，設了才啟用跨 worker 的磁碟快取）
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                ttl=int(os.getenv("RESULT_CACHE_TTL", str(6 * 3600))),
+                max_items=int(os.getenv("RESULT_CACHE_SIZE", "128")),
+                db_path=os.getenv("RESULT_CACHE_DB") or None,
+            )
+        return _cache
@@ -0,0 +1,96 @@
+# modules/retrieval.py
+"""
+/ask 的檢索步驟：用 BM25 把評論依問題排名，只送最相關的幾則給模型。
+
+每份評論（corpus hash）第一次被問時建一次倒排索引（jieba 細切 + NumPy 陣列），
+之後同一份評論的提問只要查索引，不用重新分詞。
+"""
+
+import os, threading
+from collections import OrderedDict
+import numpy as np
+from modules.analysis import segment_for_search, query_words, with_bigrams
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# 記憶體裡最多保留幾份評論的索引
+INDEX_CACHE_SIZE = int(os.getenv("RETRIEVAL_INDEX_CACHE", "16"))
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+class Bm25Index:
+    """
+    倒排索引，以 CSR 形式存：詞 id → postings[starts[t]:starts[t + 1]]（評論編號與詞頻）。
+    """
+
+    def __init__(self, docs_tokens):
+        import pandas as pd
+        lengths = np.fromiter((len(t) for t in docs_tokens), dtype=np.int64,
+                              count=len(docs_tokens))
+        self.n_docs = len(docs_tokens)
+        self.doc_len = lengths.astype(float)
+        self.avgdl = float(lengths.mean()) if self.n_docs and lengths.sum() else 1.0
+
+        words = np.fromiter((w for t in docs_tokens for w in t), dtype=object,
+                            count=int(lengths.sum()))
+        codes, vocab = pd.factorize(words)
+        self.vocab = {w: i for i, w in enumerate(vocab)}
+        docs = np.repeat(np.arange(self.n_docs), lengths)
+        # (詞, 評論) 配對排序後數相鄰重複就是詞頻（比 np.unique 快）
+        pairs = np.sort(codes.astype(np.int64) * max(self.n_docs, 1) + docs)
+        first = np.flatnonzero(np.concatenate(([True], pairs[1:] != pairs[:-1]))) \
+            if len(pairs) else np.zeros(0, dtype=np.int64)
+        uniq = pairs[first]
+        tf = np.diff(np.append(first, len(pairs)))
+        term_ids = uniq // max(self.n_docs, 1)
+        self.post_docs = uniq % max(self.n_docs, 1)
+        self.post_tf = tf.astype(float)
+        self.starts = np.searchsorted(term_ids, np.arange(len(vocab) + 1))
+        df = np.diff(self.starts)
+        self.idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    def scores(self, terms):
+        """每則評論對 terms 的 BM25 分數（沒有任何詞命中的是 0）"""
+        score = np.zeros(self.n_docs)
+        for term in set(terms):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            lo, hi = self.starts[t], self.starts[t + 1]
+            docs, tf = self.post_docs[lo:hi], self.post_tf[lo:hi]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[docs] / self.avgdl)
+            score[docs] += self.idf[t] * tf * (BM25_K1 + 1) / (tf + norm)
+        return score
+
+
+def get_index(corpus, texts):
+    """取得（或建立）這份評論的索引；corpus 是 answer_cache.corpus_hash"""
+    with _indexes_lock:
+        index = _indexes.get(corpus)
+        if index is not None:
+            _indexes.move_to_end(corpus)
+            return index
+    # 分詞可能要幾秒，不要拿著鎖做
+    index = Bm25Index([with_bigrams(words) for words in segment_for_search(texts)])
+    with _indexes_lock:
+        _indexes[corpus] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def question_terms(question):
+    """問題切成查詢詞：細切、去掉停用詞與「的」「是」這類單字"""
+    return query_words(with_bigrams(segment_for_search([question])[0]))
+
+
+def rank_reviews(corpus, texts, question):
+    """回傳 (有命中的評論 index，依分數由高到低, 分數陣列)"""
+    index = get_index(corpus, texts)
+    score = index.scores(question_terms(question))
+    hits = np.flatnonzero(score > 0)
+    # 同分時保留原本順序（新到舊）
+    order = hits[np.lexsort((hits, -score[hits]))]
+    return order, score
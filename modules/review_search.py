@@ -0,0 +1,240 @@
+# modules/review_search.py
+"""
+評論全文檢索：資料庫是 SQLite 時用 FTS5 建索引，內容是 jieba 細切後以空白分隔的詞，
+長的中文詞另外補上二字子詞（analysis.with_bigrams）
+（contentless 表，只存索引不存原文，rowid 對應 reviews.id），以 bm25 排名；
+其他資料庫或 SQLite 沒編進 FTS5 時退回 LIKE 逐筆比對（慢，只適合少量資料）。
+
+    python -m modules.review_search --rebuild   # 重建整個索引
+"""
+
+import re, sys, time, html, threading
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from modules.review_store import get_session
+from modules.analysis import segment_for_search, query_words, with_bigrams
+
+INDEX_BATCH = 5000
+# 索引內容（分詞方式）改變時加一：表名帶版本，舊版的表會被丟掉，新表從頭重建
+INDEX_VERSION = 2
+FTS_TABLE = f"review_fts_v{INDEX_VERSION}"
+
+_fts = None
+_index_lock = threading.Lock()
+
+
+def fts_available(session):
+    """第一次呼叫時建立 FTS5 表；不是 SQLite 或不支援 FTS5 就回傳 False"""
+    global _fts
+    if _fts is None:
+        if session.bind.dialect.name != "sqlite":
+            _fts = False
+        else:
+            try:
+                session.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}"
+                    " USING fts5(tokens, content='', tokenize='unicode61')"
+                ))
+                _drop_stale_indexes(session)
+                session.commit()
+                _fts = True
+            except OperationalError:
+                session.rollback()
+                _fts = False
+    return _fts
+
+
+def _drop_stale_indexes(session):
+    """丟掉舊版的索引表（review_fts、review_fts_v1 …），它們的分詞方式和查詢對不上"""
+    stale = session.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%'"
+        " AND (name = 'review_fts' OR name GLOB 'review_fts_v[0-9]*') AND name != :current"
+    ), {"current": FTS_TABLE}).scalars().all()
+    for name in stale:
+        session.execute(text(f'DROP TABLE "{name}"'))
+
+
+def index_pending(batch_size=INDEX_BATCH):
+    """
+    把還沒進索引的評論加進去，回傳這次新增幾筆。
+    reviews.id 是遞增的，索引裡最大的 rowid 之後的都是新評論。
+    """
+    added = 0
+    with _index_lock, get_session() as session:
+        if not fts_available(session):
+            return 0
+        while True:
+            last = session.execute(text(f"SELECT max(rowid) FROM {FTS_TABLE}")).scalar() or 0
+            rows = session.execute(
+                text("SELECT id, text FROM reviews WHERE id > :last ORDER BY id LIMIT :n"),
+                {"last": last, "n": batch_size}
+            ).all()
+            if not rows:
+                return added
+            tokens = segment_for_search([r.text or "" for r in rows])
+            try:
+                session.execute(
+                    text(f"INSERT INTO {FTS_TABLE} (rowid, tokens) VALUES (:id, :tokens)"),
+                    [{"id": r.id, "tokens": " ".join(with_bigrams(words))}
+                     for r, words in zip(rows, tokens)]
+                )
+                session.commit()
+            except IntegrityError:
+                # 另一個 worker 剛好也在建同一批，重新看一次最大的 rowid
+                session.rollback()
+                continue
+            added += len(rows)
+
+
+def _has_pending(session):
+    """索引裡最大的 rowid 比 reviews 最大的 id 小，就還有評論沒進索引（兩個查詢都只看 B-tree 的尾端）"""
+    last = session.execute(text(f"SELECT max(rowid) FROM {FTS_TABLE}")).scalar() or 0
+    newest = session.execute(text("SELECT max(id) FROM reviews")).scalar() or 0
+    return newest > last
+
+
+def index_pending_background():
+    """在背景 thread 補索引，不讓搜尋請求等分詞；已經有人在建索引就不再開"""
+    if _index_lock.locked():
+        return
+    threading.Thread(target=index_pending, name="review-fts-index", daemon=True).start()
+
+
+def rebuild_index():
+    with get_session() as session:
+        if fts_available(session):
+            session.execute(text(f"DROP TABLE {FTS_TABLE}"))
+            session.commit()
+    global _fts
+    _fts = None
+    return index_pending()
+
+
+def query_terms(query):
+    """
+    把查詢字串切成詞（精確模式），只留有字母或數字的詞，再去掉停用詞與「的」「是」這類單字：
+    詞之間是 AND，留著它們會讓自然語句的查詢幾乎什麼都找不到
+    """
+    import jieba
+    return query_words([w for w in jieba.cut(query or "") if any(c.isalnum() for c in w)])
+
+
+def term_variants(terms):
+    """
+    每個查詢詞連同它的二字子詞成一組：「停車位」→ [停車位, 停車, 車位]。
+    組內是 OR（評論寫「停車」「車位」也算提到），組與組之間是 AND。
+    """
+    return [list(dict.fromkeys(with_bigrams([t]))) for t in terms]
+
+
+def _quote(term):
+    # 加上雙引號當成片語；使用者輸入的引號要跳脫
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _match_expr(groups):
+    return " AND ".join(
+        "(" + " OR ".join(_quote(t) for t in group) + ")" if len(group) > 1 else _quote(group[0])
+        for group in groups
+    )
+
+
+def snippet(review_text, terms, width=80):
+    """
+    從原文取出第一個命中附近 width 個字，命中的詞用 <mark> 包起來。
+    回傳已經 HTML escape 的字串。
+    """
+    review_text = review_text or ""
+    if not terms:
+        return html.escape(review_text[:width])
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True)),
+                         re.IGNORECASE)
+    m = pattern.search(review_text)
+    start = max((m.start() if m else 0) - width // 3, 0)
+    end = min(start + width, len(review_text))
+    part = review_text[start:end]
+    out, pos = [], 0
+    for hit in pattern.finditer(part):
+        out.append(html.escape(part[pos:hit.start()]))
+        out.append("<mark>" + html.escape(hit.group()) + "</mark>")
+        pos = hit.end()
+    out.append(html.escape(part[pos:]))
+    # 相鄰的命中合成一段（「<mark>櫃</mark><mark>檯</mark>」→「<mark>櫃檯</mark>」）
+    marked = "".join(out).replace("</mark><mark>", "")
+    return ("…" if start > 0 else "") + marked + ("…" if end < len(review_text) else "")
+
+
+def search(query, place_id=None, rating=None, start_date=None, end_date=None,
+           limit=20, offset=0):
+    """
+    全文檢索評論，可再依 place_id、星等、日期（start_date <= date < end_date）篩選。
+    回傳 {"results": [...], "total": 命中筆數, "took_ms": 耗時, "engine": "fts5" / "like"}。
+    """
+    t0 = time.perf_counter()
+    terms = query_terms(query)
+    if not terms:
+        raise ValueError("請輸入關鍵字")
+    groups = term_variants(terms)
+
+    filters, params = [], {"limit": limit, "offset": offset}
+    if place_id:
+        filters.append("r.place_id = :place_id")
+        params["place_id"] = place_id
+    if rating is not None:
+        filters.append("r.rating = :rating")
+        params["rating"] = rating
+    if start_date is not None:
+        filters.append("r.date >= :start_date")
+        params["start_date"] = str(start_date)
+    if end_date is not None:
+        filters.append("r.date < :end_date")
+        params["end_date"] = str(end_date)
+
+    with get_session() as session:
+        if fts_available(session):
+            # 索引平常在 run_analysis 結束時補；還有沒進索引的（例如 /batch 寫入的）就丟到背景補，
+            # 這次查詢先用現有的索引
+            if _has_pending(session):
+                index_pending_background()
+            engine = "fts5"
+            params["match"] = _match_expr(groups)
+            where = " AND ".join([f"{FTS_TABLE} MATCH :match"] + filters)
+            base = f"FROM {FTS_TABLE} JOIN reviews r ON r.id = {FTS_TABLE}.rowid WHERE {where}"
+            order = f"ORDER BY bm25({FTS_TABLE})"
+            score = f"bm25({FTS_TABLE})"
+        else:
+            engine = "like"
+            for i, group in enumerate(groups):
+                likes = []
+                for j, t in enumerate(group):
+                    likes.append(f"r.text LIKE :term{i}_{j}")
+                    params[f"term{i}_{j}"] = f"%{t}%"
+                filters.append("(" + " OR ".join(likes) + ")")
+            base = "FROM reviews r WHERE " + " AND ".join(filters)
+            order = "ORDER BY r.date DESC"
+            score = "0"
+        rows = session.execute(text(
+            f"SELECT r.place_id, r.review_id, r.author, r.rating, r.date, r.text, {score} AS score"
+            f" {base} {order} LIMIT :limit OFFSET :offset"
+        ), params).all()
+        total = session.execute(text(f"SELECT count(*) {base}"), params).scalar()
+
+    results = [{
+        "place_id": r.place_id,
+        "review_id": r.review_id,
+        "author": r.author,
+        "rating": r.rating,
+        "date": str(r.date) if r.date else None,
+        "snippet": snippet(r.text, [t for group in groups for t in group]),
+        # bm25 越小越相關，轉成越大越好
+        "score": round(-float(r.score), 6),
+    } for r in rows]
+    return {"results": results, "total": total, "terms": terms,
+            "took_ms": round((time.perf_counter() - t0) * 1000, 1), "engine": engine}
+
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv[1:]:
+        print(f"重建索引：{rebuild_index()} 則評論")
+    else:
+        print(f"新增索引：{index_pending()} 則評論")
@@ -0,0 +1,119 @@
+# modules/review_sessions.py
+"""
+分析結果頁與 /ask 之間的評論暫存：結果頁只帶一個短的 result_id，
+/ask 用 result_id 從伺服器端取回評論，不必每次把整包評論 JSON 上傳再解析。
+"""
+
+import os, json, base64, secrets, threading
+from modules.result_cache import ResultCache
+from modules.answer_cache import corpus_hash
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_review_sessions():
+    """
+    每個 process 共用一個暫存，由環境變數設定：
+    REVIEW_SESSION_TTL（秒）、REVIEW_SESSION_SIZE（記憶體筆數）、
+    REVIEW_SESSION_DB（SQLite 路徑，未設定時沿用 RESULT_CACHE_DB；多個 worker 要共用就必須設定）
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultCache(
+                ttl=int(os.getenv("REVIEW_SESSION_TTL", str(24 * 3600))),
+                max_items=int(os.getenv("REVIEW_SESSION_SIZE", "64")),
+                db_path=os.getenv("REVIEW_SESSION_DB") or os.getenv("RESULT_CACHE_DB") or None,
+                max_disk_items=int(os.getenv("REVIEW_SESSION_DISK_SIZE", "500")),
+                table="review_sessions",
+            )
+        return _store
+
+
+def new_result_id():
+    return secrets.token_urlsafe(12)
+
+
+def save_session(result_id, reviews, **meta):
+    """
+    存一份評論（以及 place_id、年份等附帶資訊），回傳 result_id。
+    順便算好 corpus_hash，/ask 查回答快取時不用每次重算。
+    """
+    get_review_sessions().set(result_id, dict(meta, reviews=reviews,
+                                              corpus_hash=corpus_hash(reviews)))
+    return result_id
+
+
+def load_session(result_id):
+    """取回 save_session 存的內容；不存在或已過期回傳 None"""
+    if not result_id:
+        return None
+    return get_review_sessions().get(result_id)
+
+
+def ensure_session(result_id, reviews, **meta):
+    """結果頁顯示前呼叫：暫存已過期（或在別的 worker）就重新存一份"""
+    if load_session(result_id) is None:
+        save_session(result_id, reviews, **meta)
+    return result_id
+
+
+# 評論列表的排序方式：(排序 key, 是否反向)；同分時維持原本順序
+REVIEW_SORTS = {
+    "newest": (lambda r: r.get("date") or "", True),
+    "oldest": (lambda r: r.get("date") or "9999", False),
+    "rating_desc": (lambda r: r.get("rating") or 0, True),
+    "rating_asc": (lambda r: r.get("rating") or 6, False),
+}
+REVIEWS_PAGE_SIZE = int(os.getenv("REVIEWS_PAGE_SIZE", "20"))
+REVIEWS_MAX_PAGE_SIZE = 100
+
+
+def _encode_cursor(offset, signature):
+    raw = json.dumps([offset, signature], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor, signature):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        offset, sig = json.loads(raw)
+        offset = int(offset)
+    except (ValueError, TypeError):
+        raise ValueError("cursor 格式錯誤")
+    if sig != signature or offset < 0:
+        raise ValueError("cursor 與目前的篩選條件不符，請從第一頁重新載入")
+    return offset
+
+
+def page_reviews(reviews, cursor=None, limit=None, rating=None, year=None, sort="newest"):
+    """
+    從一次分析結果裡取一頁評論，可依星等 / 年份篩選、依日期或星等排序。
+    回傳 {"reviews": [...], "next_cursor": 下一頁的 cursor（沒有了是 None）, "total": 符合條件的筆數}。
+    結果是不會變的快照，cursor 記錄位置與篩選條件，換了條件的舊 cursor 會被拒絕（ValueError）。
+    """
+    if sort not in REVIEW_SORTS:
+        raise ValueError(f"sort 必須是 {', '.join(REVIEW_SORTS)} 其中之一")
+    limit = max(1, min(limit or REVIEWS_PAGE_SIZE, REVIEWS_MAX_PAGE_SIZE))
+    signature = [rating, year, sort]
+    offset = _decode_cursor(cursor, signature) if cursor else 0
+
+    items = reviews
+    if rating is not None:
+        items = [r for r in items if r.get("rating") == rating]
+    if year is not None:
+        prefix = f"{year:04d}-"
+        items = [r for r in items if (r.get("date") or "").startswith(prefix)]
+    key, reverse = REVIEW_SORTS[sort]
+    # 評論本來就是新到舊，預設排序不用再排
+    if sort != "newest":
+        items = sorted(items, key=key, reverse=reverse)
+
+    page = items[offset:offset + limit]
+    end = offset + len(page)
+    return {
+        "reviews": page,
+        "next_cursor": _encode_cursor(end, signature) if end < len(items) else None,
+        "total": len(items),
+    }
@@ -0,0 +1,414 @@
+# modules/review_store.py
+
+import os, time, datetime, threading
+from collections import Counter, defaultdict
+from sqlalchemy import (
+    create_engine, Column, Integer, String, Text, Date, DateTime,
+    UniqueConstraint, ForeignKey, select, func, inspect, text
+)
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.exc import IntegrityError
+import numpy as np
+from modules.analysis import segment, doc_terms, get_stopwords, idf, top_indices, KEYWORD_RANKING
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///reviews.db")
+
+Base = declarative_base()
+
+
+class Review(Base):
+    __tablename__ = "reviews"
+    __table_args__ = (UniqueConstraint("place_id", "review_id"),)
+
+    id = Column(Integer, primary_key=True)
+    place_id = Column(String(255), index=True, nullable=False)
+    review_id = Column(String(255), nullable=False)
+    author = Column(String(255))
+    rating = Column(Integer)
+    time_txt = Column(String(64))
+    date = Column(Date, index=True)
+    # date 有多準（modules/dates.py 的 day / week / month / year / unknown）；舊資料是 NULL
+    date_precision = Column(String(16))
+    text = Column(Text)
+    scraped_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "review_id": self.review_id,
+            "author": self.author,
+            "rating": self.rating,
+            "time_txt": self.time_txt,
+            "date": self.date.isoformat() if self.date else None,
+            "date_precision": self.date_precision,
+            "text": self.text,
+        }
+
+
+class ScrapeState(Base):
+    """
+    記錄每個 place 已「連續」抓到多舊：
+    以最新排序從頭捲到 oldest_date 為止的評論都已在資料庫裡。
+    """
+    __tablename__ = "scrape_state"
+
+    place_id = Column(String(255), primary_key=True)
+    oldest_date = Column(Date)
+    last_scraped_at = Column(DateTime)
+
+
+class ReviewTokens(Base):
+    """每則評論的分詞結果（空白分隔），有這筆就代表已經算進 keyword_counts"""
+    __tablename__ = "review_tokens"
+
+    review_pk = Column(Integer, ForeignKey("reviews.id"), primary_key=True)
+    tokens = Column(Text)
+
+
+class KeywordCount(Base):
+    """
+    每家店、每一年的詞頻表（含二 / 三連詞）；查任意年份區間的 Top N 只要把各年加總。
+    count 是出現次數，docs 是有幾則評論提到（文件頻率），docs_1 ~ docs_5 是其中 n 星的評論數
+    （關鍵字 × 星等交叉表直接加總，不用再掃原文；docs 減掉它們就是沒有星等的評論）。
+    """
+    __tablename__ = "keyword_counts"
+
+    place_id = Column(String(255), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    keyword = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    docs = Column(Integer, nullable=False, default=0)
+    docs_1 = Column(Integer, nullable=False, default=0)
+    docs_2 = Column(Integer, nullable=False, default=0)
+    docs_3 = Column(Integer, nullable=False, default=0)
+    docs_4 = Column(Integer, nullable=False, default=0)
+    docs_5 = Column(Integer, nullable=False, default=0)
+
+
+STARS = [5, 4, 3, 2, 1]
+
+
+# refresh_keyword_counts 撞到別的 process 同時寫入時最多重試幾次
+REFRESH_RETRIES = 3
+
+_engine = None
+_Session = None
+_init_lock = threading.Lock()
+
+
+def _migrate(engine):
+    """
+    create_all 不會改既有的表：
+    - 舊版的 keyword_counts 沒有 docs / docs_1 ~ docs_5 欄位。詞頻表與分詞表都是從 reviews 算出來的，
+      直接丟掉重建，下次 refresh_keyword_counts 會把所有評論重新分詞，各欄都會是正確的值
+      （補 0 會讓舊年份的 tfidf 與交叉表全變 0）。
+    - 舊版的 reviews 沒有 date_precision 欄位：補上欄位，既有評論留 NULL（不知道精確度）。
+    """
+    insp = inspect(engine)
+    if insp.has_table("keyword_counts") and not {"docs", "docs_5"} <= \
+            {c["name"] for c in insp.get_columns("keyword_counts")}:
+        KeywordCount.__table__.drop(engine)
+        ReviewTokens.__table__.drop(engine, checkfirst=True)
+    if insp.has_table("reviews") and \
+            "date_precision" not in {c["name"] for c in insp.get_columns("reviews")}:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE reviews ADD COLUMN date_precision VARCHAR(16)"))
+
+
+def get_session():
+    global _engine, _Session
+    with _init_lock:
+        if _Session is None:
+            _engine = create_engine(DATABASE_URL)
+            _migrate(_engine)
+            Base.metadata.create_all(_engine)
+            _Session = sessionmaker(bind=_engine, expire_on_commit=False)
+    return _Session()
+
+
+def known_review_ids(place_id):
+    with get_session() as session:
+        rows = session.execute(
+            select(Review.review_id).where(Review.place_id == place_id)
+        )
+        return {r[0] for r in rows}
+
+
+def get_scrape_state(place_id):
+    with get_session() as session:
+        return session.get(ScrapeState, place_id)
+
+
+_place_locks = defaultdict(threading.Lock)
+_place_locks_lock = threading.Lock()
+
+
+def _place_lock(place_id):
+    with _place_locks_lock:
+        return _place_locks[place_id]
+
+
+def _insert_ignore(dialect):
+    """
+    重複的 (place_id, review_id) 直接略過的 INSERT：別的 process（例如 batch CLI）
+    同時寫入同一則評論時不會撞 UNIQUE 讓整批 rollback。不支援的資料庫回傳 None。
+    """
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(Review.__table__).on_conflict_do_nothing(index_elements=["place_id", "review_id"])
+
+
+def save_reviews(place_id, reviews, full_scan=False, covered_until=None):
+    """
+    寫入新評論（以 place_id + review_id 去重），回傳實際新增筆數。
+    full_scan=True 表示這次是從最新一路捲下來，可以更新 oldest_date；
+    covered_until 表示捲動確定已經越過這個日期（依日期提早停止時）。
+    同一家店同時只有一個 thread 在寫（兩個 job 爬同一家店時各自讀 existing 再插入會互撞）；
+    跨 process 的重複由 ON CONFLICT DO NOTHING 擋掉。
+    """
+    with _place_lock(place_id), get_session() as session:
+        existing = {r[0] for r in session.execute(
+            select(Review.review_id).where(Review.place_id == place_id)
+        )}
+        rows = []
+        for r in reviews:
+            rid = r.get("review_id")
+            if not rid or rid in existing:
+                continue
+            existing.add(rid)
+            rows.append({
+                "place_id": place_id,
+                "review_id": rid,
+                "author": r.get("author"),
+                "rating": r.get("rating"),
+                "time_txt": r.get("time_txt"),
+                "date": datetime.date.fromisoformat(r["date"]) if r.get("date") else None,
+                "date_precision": r.get("date_precision"),
+                "text": r.get("text"),
+                "scraped_at": datetime.datetime.utcnow(),
+            })
+        added = 0
+        if rows:
+            dialect = session.get_bind().dialect
+            stmt = _insert_ignore(dialect.name)
+            if stmt is None:
+                session.add_all(Review(**row) for row in rows)
+                added = len(rows)
+            elif dialect.supports_sane_multi_rowcount:
+                # 一次 executemany；rowcount 不含被略過的（別的 process 搶先寫了同一則）
+                added = session.execute(stmt, rows).rowcount
+            else:
+                # driver 的 executemany 回報不了筆數就逐筆執行
+                for row in rows:
+                    added += session.execute(stmt, row).rowcount
+
+        state = session.get(ScrapeState, place_id) or ScrapeState(place_id=place_id)
+        if full_scan:
+            dates = [datetime.date.fromisoformat(r["date"]) for r in reviews if r.get("date")]
+            if covered_until is not None:
+                dates.append(covered_until)
+            if dates:
+                oldest = min(dates)
+                if state.oldest_date is None or oldest < state.oldest_date:
+                    state.oldest_date = oldest
+        state.last_scraped_at = datetime.datetime.utcnow()
+        session.merge(state)
+        session.commit()
+        return added
+
+
+def load_reviews(place_id, start_year=None, end_year=None):
+    """從資料庫取出評論（新到舊），可依 start_year <= 年份 < end_year 過濾"""
+    with get_session() as session:
+        q = select(Review).where(Review.place_id == place_id)
+        if start_year is not None:
+            q = q.where(Review.date >= datetime.date(start_year, 1, 1))
+        if end_year is not None:
+            q = q.where(Review.date < datetime.date(end_year, 1, 1))
+        q = q.order_by(Review.date.desc(), Review.id)
+        return [r.to_dict() for r in session.execute(q).scalars()]
+
+
+def refresh_keyword_counts(place_id):
+    """
+    只分詞還沒處理過的評論，把詞頻累加到 keyword_counts。
+    回傳 {"documents": 這次新分詞的評論數, "segment_seconds": 花費秒數}。
+    同一家店同時只有一個 job 在做（不同年份區間的 job 會讀到同一批 pending，各加一次就重複計數）；
+    別的 process（例如 batch CLI）搶先寫入時會撞 IntegrityError，rollback 後重新找 pending，
+    最多 REFRESH_RETRIES 次；一直撞表示不是競爭而是資料有問題，直接丟出去。
+    """
+    with _place_lock(place_id):
+        for attempt in range(REFRESH_RETRIES + 1):
+            try:
+                return _refresh_keyword_counts(place_id)
+            except IntegrityError:
+                if attempt == REFRESH_RETRIES:
+                    raise
+
+
+def _refresh_keyword_counts(place_id):
+    t0 = time.perf_counter()
+    with get_session() as session:
+        pending = session.execute(
+            select(Review.id, Review.date, Review.rating, Review.text)
+            .outerjoin(ReviewTokens, ReviewTokens.review_pk == Review.id)
+            .where(Review.place_id == place_id, ReviewTokens.review_pk.is_(None))
+        ).all()
+        if not pending:
+            return {"documents": 0, "segment_seconds": 0.0}
+
+        docs = segment([row.text or "" for row in pending])
+        stopwords = get_stopwords()
+        per_year = defaultdict(Counter)
+        per_year_docs = defaultdict(Counter)
+        # (關鍵字, 星等) → 評論數
+        per_year_stars = defaultdict(Counter)
+        for row, words in zip(pending, docs):
+            session.add(ReviewTokens(review_pk=row.id, tokens=" ".join(words)))
+            if row.date is not None:
+                terms = doc_terms(words, stopwords=stopwords)
+                unique = set(terms)
+                per_year[row.date.year].update(terms)
+                per_year_docs[row.date.year].update(unique)
+                if row.rating in STARS:
+                    per_year_stars[row.date.year].update((t, row.rating) for t in unique)
+
+        for year, cnt in per_year.items():
+            doc_cnt = per_year_docs[year]
+            star_cnt = per_year_stars[year]
+            existing = {kc.keyword: kc for kc in session.execute(
+                select(KeywordCount).where(KeywordCount.place_id == place_id,
+                                           KeywordCount.year == year)
+            ).scalars()}
+            for keyword, n in cnt.items():
+                kc = existing.get(keyword)
+                stars = {f"docs_{s}": star_cnt[(keyword, s)] for s in STARS}
+                if kc is None:
+                    session.add(KeywordCount(place_id=place_id, year=year, keyword=keyword,
+                                             count=n, docs=doc_cnt[keyword], **stars))
+                else:
+                    kc.count += n
+                    kc.docs += doc_cnt[keyword]
+                    for col, d in stars.items():
+                        setattr(kc, col, getattr(kc, col) + d)
+        session.commit()
+        return {"documents": len(pending),
+                "segment_seconds": round(time.perf_counter() - t0, 3)}
+
+
+def top_keywords(place_id, start_year=None, end_year=None, top_n=20, method=None):
+    """
+    把 start_year <= 年份 < end_year 各年的詞頻加總後排名，回傳 [{keyword, count, docs, score}]。
+    method 同 analysis.rank_keywords；這裡只有彙總後的數字，tfidf 以「是否提到」當 TF
+    （binary TF × IDF），長評論一樣不會主導排名。
+    """
+    method = method or KEYWORD_RANKING
+    with get_session() as session:
+        q = select(KeywordCount.keyword, func.sum(KeywordCount.count),
+                   func.sum(KeywordCount.docs)).where(KeywordCount.place_id == place_id)
+        n = select(func.count()).select_from(Review).where(Review.place_id == place_id)
+        if start_year is not None:
+            q = q.where(KeywordCount.year >= start_year)
+            n = n.where(Review.date >= datetime.date(start_year, 1, 1))
+        if end_year is not None:
+            q = q.where(KeywordCount.year < end_year)
+            n = n.where(Review.date < datetime.date(end_year, 1, 1))
+        stopwords = get_stopwords()
+        rows = [r for r in session.execute(q.group_by(KeywordCount.keyword))
+                if r[0] not in stopwords]
+        n_docs = session.execute(n).scalar() or 0
+    if not rows:
+        return []
+
+    keywords = [r[0] for r in rows]
+    counts = np.array([r[1] or 0 for r in rows], dtype=float)
+    docs = np.array([r[2] or 0 for r in rows], dtype=float)
+    if method == "count":
+        score = counts
+    elif method == "docs":
+        score = docs
+    else:
+        score = docs * idf(docs, n_docs)
+    if n_docs > 1:
+        # 詞組至少要在兩則評論出現才算，和 keyword_stats 一致
+        score = np.where(docs >= 2, score, 0.0)
+    return [
+        {"keyword": keywords[i], "count": int(counts[i]), "docs": int(docs[i]),
+         "score": round(float(score[i]), 4)}
+        for i in top_indices(score, top_n)
+    ]
+
+
+def keyword_ratings(place_id, keywords, start_year=None, end_year=None):
+    """
+    關鍵字 × 星等交叉表（aggregate.keyword_rating_table 的格式）：把 start_year <= 年份 < end_year
+    各年的 docs_1 ~ docs_5 加總，一個 GROUP BY 查詢，不用碰評論原文。
+    「提到」的定義和 top_keywords 的 docs 相同（分詞後的詞與連詞），不是子字串比對。
+    """
+    from modules.aggregate import keyword_rating_table
+    keywords = list(keywords)
+    if not keywords:
+        return keyword_rating_table([], [])
+    star_cols = [getattr(KeywordCount, f"docs_{s}") for s in range(1, 6)]
+    with get_session() as session:
+        q = select(KeywordCount.keyword, func.sum(KeywordCount.docs),
+                   *[func.sum(c) for c in star_cols]).where(
+            KeywordCount.place_id == place_id, KeywordCount.keyword.in_(keywords))
+        if start_year is not None:
+            q = q.where(KeywordCount.year >= start_year)
+        if end_year is not None:
+            q = q.where(KeywordCount.year < end_year)
+        rows = {r[0]: r[1:] for r in session.execute(q.group_by(KeywordCount.keyword))}
+    table = np.zeros((len(keywords), 6), dtype=np.int64)
+    for i, keyword in enumerate(keywords):
+        row = rows.get(keyword)
+        if row:
+            table[i, 1:] = [n or 0 for n in row[1:]]
+            # 第 0 欄：提到但沒有星等的評論
+            table[i, 0] = (row[0] or 0) - table[i, 1:].sum()
+    return keyword_rating_table(keywords, table)
+
+
+def fetch_reviews_incremental(place_id, place_url, start_year=None, end_year=None,
+                              **scrape_kwargs):
+    """
+    先看資料庫對這個 place 已經連續抓到多舊：
+    - 要求的區間都在已抓範圍內：只捲到碰到已知 review id 為止，補抓新評論
+    - 否則：以最新排序一路捲到比 start_year 更舊為止，全部寫回資料庫
+    最後一律從資料庫依年份取出結果。
+    """
+    # selenium / bs4 只有真的要爬時才載入
+    from modules.scraper_selenium import fetch_google_maps_reviews, check_year_range
+    check_year_range(start_year, end_year)
+
+    state = get_scrape_state(place_id)
+    covered = (
+        state is not None and state.oldest_date is not None
+        and (start_year is None or state.oldest_date <= datetime.date(start_year, 1, 1))
+    )
+    known = known_review_ids(place_id) if covered else None
+
+    # 攔截進度回報，記下捲動是否已越過 start_year
+    progress = scrape_kwargs.pop("progress", None)
+    seen = {}
+
+    def track(**fields):
+        seen.update(fields)
+        if progress:
+            progress(**fields)
+
+    scraped = fetch_google_maps_reviews(place_url, known_ids=known or None,
+                                        sort_newest=True, start_year=start_year,
+                                        progress=track, **scrape_kwargs)
+    # 「已連續抓到多舊」只有在卡片確定是新到舊時才成立；排序沒切成功（相關性排序）時
+    # 中間可能有漏掉的評論，不記錄涵蓋範圍，下次照樣完整捲動
+    newest_first = bool(seen.get("newest_first"))
+    covered_until = None
+    if newest_first and seen.get("reached_start_year"):
+        covered_until = datetime.date(start_year, 1, 1)
+    save_reviews(place_id, scraped, full_scan=newest_first and not covered,
+                 covered_until=covered_until)
+    return load_reviews(place_id, start_year, end_year)
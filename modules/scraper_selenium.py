@@ -1,7 +1,6 @@
 # modules/scraper_selenium.py
 
-import time, re, requests, datetime, os, shutil
-from dateutil.relativedelta import relativedelta
+import re, requests, datetime, os, shutil
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
@@ -10,16 +9,18 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
+from modules.driver_pool import get_driver_pool
+from modules.waits import AdaptiveWaiter
+from modules.dates import TimeTextParser
 
-def init_driver(headless=True):
+def init_driver(headless=True, debug_port=0):
     opts = Options()
 
     # 使用新版 headless 模式
     opts.add_argument("--headless=new")
 
     # 無頭模式下 container 常用 flag
-
-    opts.add_argument("--single-process")
+    # （不再使用 --single-process：driver 會被 pool 重複使用，單行程模式換頁後容易崩潰）
     opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-dev-shm-usage")
     opts.add_argument("--disable-gpu")
@@ -35,8 +36,10 @@ def init_driver(headless=True):
         "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
     )
 
-    # 遠端除錯埠，避免 DevToolsActivePort 錯誤
-    opts.add_argument("--remote-debugging-port=9222")
+    # 遠端除錯埠，避免 DevToolsActivePort 錯誤。預設 0 讓 Chromium 自己綁一個空的 port
+    # （chromedriver 從 DevToolsActivePort 檔讀實際的 port）；先找空 port 再交給 Chromium
+    # 中間會被別的實例搶走，同時啟動多個時會互撞
+    opts.add_argument(f"--remote-debugging-port={debug_port}")
 
     # 動態定位 chromium binary
     chrome_path = os.getenv("CHROME_BIN",
@@ -60,72 +63,238 @@ def expand_url(url):
         return url
 
 def parse_time_txt(time_txt: str) -> datetime.date:
-    """把 'X 年前'/'X 個月前'/'X 週前'/'X 天前' 轉成實際日期"""
-    now = datetime.datetime.now()
-    m = re.match(r"(\d+)\s*年前", time_txt)
-    if m:
-        return (now - relativedelta(years=int(m.group(1)))).date()
-    m = re.match(r"(\d+)\s*(?:個)?月前", time_txt)
-    if m:
-        return (now - relativedelta(months=int(m.group(1)))).date()
-    m = re.match(r"(\d+)\s*(?:週|周)前", time_txt)
-    if m:
-        return (now - datetime.timedelta(weeks=int(m.group(1)))).date()
-    m = re.match(r"(\d+)\s*天前", time_txt)
-    if m:
-        return (now - datetime.timedelta(days=int(m.group(1)))).date()
-    m = re.search(r"(\d{4})", time_txt)
-    if m:
-        return datetime.date(int(m.group(1)), 1, 1)
-    return now.date()
-
-def fetch_google_maps_reviews(
+    """把 'X 年前'/'X 個月前'/'3 months ago' 之類的時間文字轉成實際日期（單次呼叫用；整批卡片請用同一個 TimeTextParser）"""
+    return TimeTextParser().parse(time_txt).date
+
+def check_year_range(start_year, end_year):
+    """年份區間檢查：start_year <= 年份 < end_year，所以 end_year 必須大於 start_year"""
+    if start_year is not None and end_year is not None:
+        if end_year <= start_year:
+            raise ValueError("結束年份必須大於起始年份（區間為 start_year ≤ 年份 < end_year）！")
+
+def sort_by_newest(driver, wait):
+    """把評論排序切成「最新」，失敗就維持原本排序，回傳是否成功"""
+    try:
+        old_first = driver.find_element(By.CSS_SELECTOR, "[data-review-id]")
+        btn = wait.until(EC.element_to_be_clickable((
+            By.XPATH,
+            "//button[contains(@aria-label, '排序') or contains(@aria-label, 'Sort')]"
+        )))
+        btn.click()
+        item = wait.until(EC.element_to_be_clickable((
+            By.XPATH,
+            "//*[@role='menuitemradio' and (contains(., '最新') or contains(., 'Newest'))]"
+        )))
+        item.click()
+    except:
+        return False
+    # 等舊的卡片被換掉、新排序的卡片出現，而不是固定睡幾秒
+    try:
+        WebDriverWait(driver, 10).until(EC.staleness_of(old_first))
+        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "[data-review-id]")))
+    except:
+        pass
+    return True
+
+LAST_CARD_TIME_JS = """
+    const cards = arguments[0].querySelectorAll('[data-review-id]');
+    for (let i = cards.length - 1; i >= 0; i--) {
+      const t = cards[i].querySelector("span.rsqaWe, div[class*='review-date']");
+      if (t && t.textContent.trim()) return t.textContent.trim();
+    }
+    return null;
+"""
+
+# 在頁面裡把「還沒收割過」的評論卡片整理成 {review_id, author, rating, time_txt, text}，
+# 並標上 data-harvested，下次就不會重複回傳；prune=true 時順便清空卡片內容，讓 DOM 不會一直長大。
+# 巢狀的 [data-review-id]（卡片內的按鈕等）與沒有內文的卡片直接略過。
+# 回傳 {cards, count}，count 是收割（清空）後頁面上剩下的 [data-review-id] 數量。
+HARVEST_REVIEWS_JS = """
+    const root = arguments[0] || document;
+    const prune = !!arguments[1];
+    const out = [];
+    root.querySelectorAll('[data-review-id]:not([data-harvested])').forEach(card => {
+      if (card.parentElement && card.parentElement.closest('[data-review-id]')) return;
+      card.setAttribute('data-harvested', '1');
+      const q = sel => card.querySelector(sel);
+      const txt = el => el ? el.textContent.trim() : "";
+      const textEl = q("span.wiI7pd") || q("span[jsname='bN97Pc']") || q("div.MyEned");
+      const text = txt(textEl);
+      if (text) {
+        let rating = null;
+        const star = q("[aria-label*='顆星'],[aria-label*='star']");
+        if (star) {
+          const m = (star.getAttribute('aria-label') || '').match(/(\\d)/);
+          if (m) rating = parseInt(m[1], 10);
+        }
+        if (rating === null) {
+          rating = card.querySelectorAll("span.hCCjke.google-symbols.NhBTye.elGi1d").length;
+        }
+        out.push({
+          review_id: card.getAttribute('data-review-id'),
+          author: txt(q("div.d4r55")),
+          rating: rating,
+          time_txt: txt(q("span.rsqaWe, div[class*='review-date']")),
+          text: text
+        });
+      }
+      // 保留卡片本身（Maps 的捲動載入靠它），只丟掉裡面的節點
+      if (prune) card.replaceChildren();
+    });
+    return {cards: out, count: root.querySelectorAll('[data-review-id]').length};
+"""
+
+def extract_cards_bs4(html):
+    """備援：用 BeautifulSoup 解析整頁 HTML，回傳與 HARVEST_REVIEWS_JS 相同格式的 list"""
+    soup = BeautifulSoup(html, "html.parser")
+    raw = []
+    for card in soup.select("[data-review-id]"):
+        # 作者
+        author_el = card.select_one("div.d4r55")
+        author = author_el.get_text(strip=True) if author_el else ""
+
+        # 評分
+        rating = None
+        star_el = card.select_one("[aria-label*='顆星'],[aria-label*='star']")
+        if star_el and star_el.has_attr("aria-label"):
+            m = re.search(r"(\d)", star_el["aria-label"])
+            rating = int(m.group(1)) if m else None
+        if rating is None:
+            icons = card.select("span.hCCjke.google-symbols.NhBTye.elGi1d")
+            rating = len(icons)
+
+        # 時間文字
+        time_txt = card.select_one("span.rsqaWe, div[class*='review-date']")
+        time_txt = time_txt.get_text(strip=True) if time_txt else ""
+
+        # 內文
+        text_el = (
+            card.select_one("span.wiI7pd")
+            or card.select_one("span[jsname='bN97Pc']")
+            or card.select_one("div.MyEned")
+        )
+        text = text_el.get_text(strip=True) if text_el else ""
+
+        raw.append({
+            "review_id": card.get("data-review-id"),
+            "author": author,
+            "rating": rating,
+            "time_txt": time_txt,
+            "text": text
+        })
+    return raw
+
+def iter_google_maps_reviews(
     url: str,
     scroll_times: int = 20,
     scroll_pause: float = 1.5,
     start_year: int = None,
     end_year:   int = None,
-    debug: bool = True
+    debug: bool = True,
+    pool=None,
+    progress=None,
+    known_ids=None,
+    sort_newest=False,
+    date_aware=True,
+    extract="js",
+    prune_dom=False
 ):
     """
-    爬取 Google Maps 評論，最多捲動 scroll_times 次，也會點「更多評論」直到看不到新評論。
-    若提供 start_year 與 end_year，則僅保留 start_year <= 年份 < end_year 的評論，
-    且必須 end_year - start_year == 1。
+    爬取 Google Maps 評論的 generator：每捲動一次就收割新載入的卡片並立刻 yield，
+    呼叫端不用等整個捲動結束就能拿到前面的結果。
+    最多捲動 scroll_times 次，也會點「更多評論」直到看不到新評論。
+    若提供 start_year / end_year，則僅保留 start_year <= 年份 < end_year 的評論，
+    跨多年也只捲動一次。
+    date_aware=True 且有 start_year 時，會以最新排序，收割到早於 start_year 的評論
+    就停止捲動；scroll_times 只是安全上限。
+    每次捲動後不固定 sleep，而是在頁面裡等到卡片變多為止；scroll_pause 是初始的預估載入時間，
+    實際逾時會依最近的載入速度調整。
+    extract="js" 在瀏覽器內用 HARVEST_REVIEWS_JS 收割卡片欄位，prune_dom=True 時會清空已收割的卡片，
+    讓頁面記憶體維持平穩；"bs4"（或 JS 失敗時）才在最後抓整個 page_source 用 BeautifulSoup 解析。
+    瀏覽器從 pool（預設為 process 共用的 DriverPool）借用，用完歸還而不是 quit。
+    progress 若有提供，會以 progress(stage=..., scroll=..., reviews_found=...) 回報進度。
+    sort_newest=True 會先把排序切成「最新」。
+    known_ids 若有提供（已存在資料庫的 review id），同樣以最新排序，
+    一捲到已知的評論就停止，只回傳新的評論。
     """
-    # 年份區間檢查
-    if start_year is not None and end_year is not None:
-        if end_year - start_year != 1:
-            raise ValueError("請選擇相差一年的區間 (end_year − start_year 必須等於 1)！")
+    check_year_range(start_year, end_year)
 
     url = expand_url(url)
-    driver = init_driver(headless=True)
-    wait = WebDriverWait(driver, 20)
+    if pool is None:
+        pool = get_driver_pool(init_driver)
 
-    try:
+    def report(**fields):
+        if progress:
+            progress(**fields)
+
+    seen = set()
+    # 整次爬取共用一個參考時間，重複的時間文字只解析一次
+    parse_date = TimeTextParser()
+
+    def accept(raw):
+        """過濾年份、已知 id 與重複內文，轉成最終格式"""
+        for r in raw:
+            if known_ids and r["review_id"] in known_ids:
+                continue
+
+            parsed = parse_date.parse(r["time_txt"])
+            date = parsed.date
+            # 年份過濾
+            if start_year is not None and date.year < start_year:
+                continue
+            if end_year is not None and date.year >= end_year:
+                continue
+
+            text = r["text"]
+            if not text or text in seen:
+                continue
+            seen.add(text)
+
+            yield {
+                "review_id": r["review_id"],
+                "author": r["author"],
+                "rating": r["rating"],
+                "time_txt": r["time_txt"],
+                "date": date.isoformat(),
+                "date_precision": parsed.precision,
+                "text": text
+            }
+
+    report(stage="loading")
+    waiter = AdaptiveWaiter(initial=scroll_pause)
+    with pool.driver() as driver:
+        wait = WebDriverWait(driver, 20)
         driver.get(url)
-        # (1) 點第一筆搜尋結果
+        # (1) 點第一筆搜尋結果（點完不用睡，下一步會等評論 Tab 可以點）
         try:
-            first = wait.until(EC.element_to_be_clickable(
+            first = waiter.until(wait, EC.element_to_be_clickable(
                 (By.CSS_SELECTOR, "div.section-result, div[data-result-index]")
             ))
             first.click()
-            time.sleep(2)
         except:
             pass
 
-        # (2) 點「評論」Tab
+        # (2) 點「評論」Tab（點完由下一步等評論卡片出現）
         try:
-            tab = wait.until(EC.element_to_be_clickable((
+            tab = waiter.until(wait, EC.element_to_be_clickable((
                 By.XPATH,
                 "//button[@role='tab' and (contains(., '評論') or contains(., 'Reviews'))]"
             )))
             tab.click()
-            time.sleep(2)
         except:
             pass
 
         # (3) 等待至少一則評論
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "[data-review-id]")))
+        waiter.until(wait, EC.presence_of_element_located((By.CSS_SELECTOR, "[data-review-id]")))
+
+        # (3.5) 增量 / 依日期模式：最新的排最前面，碰到已知評論或太舊的評論就可以停
+        newest_first = False
+        if sort_newest or known_ids or (date_aware and start_year is not None):
+            newest_first = sort_by_newest(driver, wait)
+        stop_by_date = date_aware and newest_first and start_year is not None
+        reached_start_year = False
+        # 用完 scroll_times 次還有新卡片（沒碰到停止條件）：結果可能被截斷
+        scroll_capped = False
 
         # (4) 找可捲動容器
         scrollable = driver.execute_script("""
@@ -138,81 +307,108 @@ def fetch_google_maps_reviews(
             return getScrollParent(c);
         """)
 
-        # (5) 滾動 + 點更多評論，最多執行 scroll_times 次
-        prev_count = 0
-        for _ in range(scroll_times):
+        def harvest():
+            """收割新卡片，回傳 (raw list, 頁面上剩下的卡片數)；失敗回傳 (None, None)"""
+            try:
+                res = driver.execute_script(HARVEST_REVIEWS_JS, scrollable, prune_dom)
+                return res["cards"], res["count"]
+            except Exception as e:
+                print(f"[Debug] 頁面內解析失敗，改用 BeautifulSoup：{e}")
+                return None, None
+
+        def should_stop(batch):
+            """依這批收割結果判斷是否已碰到已知評論，或已早於 start_year"""
+            nonlocal reached_start_year
+            # 兩種提早停止都假設卡片是新到舊；排序沒切成功（相關性排序）就只能捲到上限
+            if known_ids and newest_first and any(r["review_id"] in known_ids for r in batch):
+                return True
+            if stop_by_date:
+                times = [r["time_txt"] for r in batch if r["time_txt"]]
+                # 要連精確度的誤差範圍都早於 start_year 才停：「1 年前」只知道大概是哪一年，
+                # 算出來是去年底的卡片，實際上可能是今年初
+                if times and parse_date.parse(times[-1]).latest() < datetime.date(start_year, 1, 1):
+                    reached_start_year = True
+                    return True
+            return False
+
+        # (5) 滾動 + 點更多評論，最多執行 scroll_times 次；每次等到卡片變多（或逾時）為止，
+        #     然後馬上收割這次新載入的卡片
+        prev_count = len(scrollable.find_elements(By.CSS_SELECTOR, "[data-review-id]"))
+        harvested = 0
+        stop = False
+        if extract == "js":
+            batch, count = harvest()
+            if batch is None:
+                extract = "bs4"
+            else:
+                prev_count = count
+                harvested += len(batch)
+                yield from accept(batch)
+                stop = should_stop(batch)
+
+        for i in range(scroll_times):
+            if stop:
+                break
             driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scrollable)
-            time.sleep(scroll_pause)
             # 嘗試點「Load more」
             try:
                 more = scrollable.find_element(By.XPATH,
                     ".//button[contains(., 'Load more') or contains(., '顯示更多評論')]"
                 )
                 more.click()
-                time.sleep(scroll_pause)
             except:
                 pass
 
-            cards = scrollable.find_elements(By.CSS_SELECTOR, "[data-review-id]")
-            curr_count = len(cards)
+            curr_count = waiter.wait_for_cards(driver, scrollable, prev_count)
             if curr_count == prev_count:
+                report(stage="scrolling", scroll=i + 1, reviews_found=harvested or curr_count)
                 break
+
+            if extract == "js":
+                batch, count = harvest()
+                if batch is None:
+                    extract = "bs4"
+                else:
+                    curr_count = count
+                    harvested += len(batch)
+                    yield from accept(batch)
+                    stop = should_stop(batch)
+            elif (known_ids and newest_first) or stop_by_date:
+                # bs4 模式沒有逐次收割，只能直接看頁面上的卡片
+                batch = [{"review_id": rid, "time_txt": ""} for rid in driver.execute_script(
+                    "return Array.from(arguments[0].querySelectorAll('[data-review-id]'))"
+                    ".map(e => e.getAttribute('data-review-id'))",
+                    scrollable
+                )]
+                if stop_by_date and batch:
+                    batch[-1]["time_txt"] = driver.execute_script(LAST_CARD_TIME_JS, scrollable) or ""
+                stop = should_stop(batch)
+            report(stage="scrolling", scroll=i + 1, reviews_found=harvested or curr_count)
             prev_count = curr_count
+        else:
+            scroll_capped = not stop
 
-        html = driver.page_source
+        html = None
+        if extract != "js" or debug:
+            html = driver.page_source
         if debug:
             with open("debug_final.html", "w", encoding="utf-8") as f:
                 f.write(html)
-    finally:
-        driver.quit()
 
-    # (6) 解析 & 過濾
-    soup = BeautifulSoup(html, "html.parser")
-    results, seen = [], set()
-    for card in soup.select("[data-review-id]"):
-        # 作者
-        author_el = card.select_one("div.d4r55")
-        author = author_el.get_text(strip=True) if author_el else ""
-
-        # 評分
-        rating = None
-        star_el = card.select_one("[aria-label*='顆星'],[aria-label*='star']")
-        if star_el and star_el.has_attr("aria-label"):
-            m = re.search(r"(\d)", star_el["aria-label"])
-            rating = int(m.group(1)) if m else None
-        if rating is None:
-            icons = card.select("span.hCCjke.google-symbols.NhBTye.elGi1d")
-            rating = len(icons)
-
-        # 時間文字 & 解析日期
-        time_txt = card.select_one("span.rsqaWe, div[class*='review-date']")
-        time_txt = time_txt.get_text(strip=True) if time_txt else ""
-        date = parse_time_txt(time_txt)
-
-        # 年份過濾
-        if start_year is not None and end_year is not None:
-            if not (start_year <= date.year < end_year):
-                continue
-
-        # 內文
-        text_el = (
-            card.select_one("span.wiI7pd")
-            or card.select_one("span[jsname='bN97Pc']")
-            or card.select_one("div.MyEned")
-        )
-        text = text_el.get_text(strip=True) if text_el else ""
-        if not text or text in seen:
-            continue
-        seen.add(text)
-
-        results.append({
-            "author": author,
-            "rating": rating,
-            "time_txt": time_txt,
-            "date": date.isoformat(),
-            "text": text
-        })
+    # (6) 備援解析 & 統計
+    timing = waiter.summary()
+    if debug:
+        print(f"[Debug] 等待 {timing['wait_seconds']}s，其餘工作 {timing['work_seconds']}s")
+    report(stage="parsing", reached_start_year=reached_start_year, newest_first=newest_first,
+           scroll_capped=scroll_capped, **timing)
+    if extract != "js":
+        yield from accept(extract_cards_bs4(html))
 
+def fetch_google_maps_reviews(url: str, **kwargs):
+    """
+    iter_google_maps_reviews 的 list 版本（參數相同），捲動結束後一次回傳全部評論。
+    """
+    results = list(iter_google_maps_reviews(url, **kwargs))
     print(f"[Debug] 抓到 {len(results)} 筆符合條件的評論")
     return results
 
@@ -0,0 +1,67 @@
+# modules/startup_budget.py
+"""
+量測 worker 開機成本：在乾淨的子 process 裡 import app，記錄耗時、最大 RSS，
+以及哪些重量級套件被載入了。
+
+    python -m modules.startup_budget
+    STARTUP_BUDGET_SECONDS=1.5 STARTUP_BUDGET_RSS_MB=150 python -m modules.startup_budget
+
+超過預算或載入了不該在開機時載入的套件就以非 0 結束，可以放進 CI / Docker build。
+"""
+
+import os, sys, json, subprocess
+
+# 這些只在真的爬 / 分析 / 問 AI 時才需要，不應該在 import app 時載入
+HEAVY_MODULES = ["selenium", "bs4", "pandas", "openai", "tiktoken", "sqlalchemy"]
+
+_PROBE = """
+import sys, time, json, resource
+t0 = time.perf_counter()
+import app
+seconds = time.perf_counter() - t0
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss /= 1024
+print(json.dumps({
+    "seconds": round(seconds, 3),
+    "max_rss_mb": round(rss / 1024, 1),
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def measure(preload_jieba=False):
+    """在子 process 量測 import app；預設不預載 jieba，只看 import 本身的成本"""
+    env = dict(os.environ, JIEBA_PRELOAD="1" if preload_jieba else "0")
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE % HEAVY_MODULES],
+        env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"import app 失敗：\n{out.stderr.strip()}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    budget_seconds = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+    budget_rss_mb = float(os.getenv("STARTUP_BUDGET_RSS_MB", "200"))
+    result = measure(preload_jieba=os.getenv("JIEBA_PRELOAD") == "1")
+    result["budget_seconds"] = budget_seconds
+    result["budget_rss_mb"] = budget_rss_mb
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    problems = []
+    if result["seconds"] > budget_seconds:
+        problems.append(f"import app 花了 {result['seconds']}s，超過 {budget_seconds}s")
+    if result["max_rss_mb"] > budget_rss_mb:
+        problems.append(f"RSS {result['max_rss_mb']}MB，超過 {budget_rss_mb}MB")
+    if result["loaded"]:
+        problems.append("開機時就載入了：" + ", ".join(result["loaded"]))
+    for p in problems:
+        print(f"⚠️ {p}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
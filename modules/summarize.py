@@ -0,0 +1,225 @@
+# modules/summarize.py
+"""
+評論太多、塞不進一次提問時的 map-reduce 摘要：
+
+1. map：依 token 預算把評論切成 chunk，多個 chunk 同時丟給模型摘要（有上限的 thread pool）
+2. reduce：把 chunk 摘要合併；合併後還是超過預算就再分組摘要一輪，直到塞得下
+3. 提問時只送最後的摘要
+
+chunk 摘要與最終摘要都以內容的 hash 快取，同一份評論問第二個問題不用再呼叫 map。
+
+預設先試檢索（modules.retrieval）：問題問的是具體面向（停車、服務、價格…）時只送最相關的評論，
+比摘要便宜也保留原文；問題跟評論幾乎對不上（「整體評價如何」）才走摘要。
+"""
+
+import os, time, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from modules.llm import LLM_MODEL, chat, count_tokens, truncate_tokens
+from modules.rate_limit import BACKGROUND
+from modules.result_cache import ResultCache
+
+# 上下文組法：retrieval（依問題挑相關評論，對不上才摘要）或 summary（一律摘要）
+CONTEXT_MODE = os.getenv("ASK_CONTEXT_MODE", "retrieval")
+# 評論總 token 數在這以內就直接整包送出，不做摘要（retrieval 模式下檢索沒結果時也一樣）
+DIRECT_TOKEN_BUDGET = int(os.getenv("ASK_DIRECT_TOKEN_BUDGET", "12000"))
+# retrieval 模式下送出的評論 token 上限、最多幾則、至少要命中幾則才用檢索結果
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("ASK_RETRIEVAL_TOKENS", "3000"))
+RETRIEVAL_TOP_K = int(os.getenv("ASK_RETRIEVAL_TOP_K", "40"))
+RETRIEVAL_MIN_HITS = int(os.getenv("ASK_RETRIEVAL_MIN_HITS", "5"))
+# 每個 map chunk 的 token 上限、每份摘要的輸出上限
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+CHUNK_SUMMARY_TOKENS = int(os.getenv("SUMMARY_CHUNK_OUTPUT_TOKENS", "400"))
+# 最終摘要的 token 上限（reduce 直到低於這個數字）
+FINAL_SUMMARY_TOKENS = int(os.getenv("SUMMARY_FINAL_TOKENS", "1500"))
+# reduce 最多幾輪；模型不一定遵守字數上限，到上限後直接截斷，不再花錢多跑一輪
+MAX_REDUCE_ROUNDS = int(os.getenv("SUMMARY_MAX_REDUCE_ROUNDS", "3"))
+# 同時進行的摘要呼叫數
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# 提示詞改了就換版本號，舊的快取自然失效
+PROMPT_VERSION = "1"
+
+MAP_PROMPT = (
+    "以下是同一家店的多則消費者評論（每行一則，開頭是星等）。"
+    "請用繁體中文濃縮成不超過 {limit} 字的重點摘要，保留具體的優點、缺點、"
+    "常被提到的項目與大致比例，不要加入評論沒提到的內容：\n\n{content}"
+)
+REDUCE_PROMPT = (
+    "以下是同一家店多段評論的摘要。請用繁體中文整合成一份不超過 {limit} 字的摘要，"
+    "合併重複的重點，保留具體的優缺點與出現頻率：\n\n{content}"
+)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """
+    chunk 摘要快取：SUMMARY_CACHE_TTL（秒）、SUMMARY_CACHE_SIZE（記憶體筆數），
+    SQLite 路徑沿用 SUMMARY_CACHE_DB 或 RESULT_CACHE_DB
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                ttl=int(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600))),
+                max_items=int(os.getenv("SUMMARY_CACHE_SIZE", "2048")),
+                db_path=os.getenv("SUMMARY_CACHE_DB") or os.getenv("RESULT_CACHE_DB") or None,
+                max_disk_items=int(os.getenv("SUMMARY_CACHE_DISK_SIZE", "20000")),
+                table="summary_cache",
+            )
+        return _cache
+
+
+def review_line(r):
+    rating = f"{r['rating']}★ " if r.get("rating") else ""
+    return rating + " ".join((r.get("text") or "").split())
+
+
+def chunk_by_tokens(texts, max_tokens=None):
+    """
+    依 token 數把文字切成多組，每組總和 <= max_tokens；
+    單一文字超過 max_tokens 就截斷。回傳 [(texts, tokens)]。
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    chunks = []
+    current, count = [], 0
+    for txt in texts:
+        n = count_tokens(txt)
+        if n > max_tokens:
+            txt, n = truncate_tokens(txt, max_tokens), max_tokens
+        if current and count + n > max_tokens:
+            chunks.append((current, count))
+            current, count = [], 0
+        current.append(txt)
+        count += n
+    if current:
+        chunks.append((current, count))
+    return chunks
+
+
+def _key(kind, content):
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return (kind, LLM_MODEL, PROMPT_VERSION, digest)
+
+
+def _summarize(kind, prompt, content, limit, max_tokens, stats):
+    key = _key(kind, content)
+    cache = get_summary_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        with stats["lock"]:
+            stats["cached_calls"] += 1
+        return cached
+    messages = [{"role": "user", "content": prompt.format(limit=limit, content=content)}]
+    # 推理模型可能把 max_tokens 全花在思考上：回傳空的或被截斷（finish_reason == "length"）
+    # 就放寬上限重試一次，還是不行就丟錯，不完整的摘要不能進快取（會污染之後所有提問）
+    for attempt in range(2):
+        resp = chat(messages, max_tokens=max_tokens * (attempt + 1), temperature=0.3,
+                    priority=BACKGROUND)
+        with stats["lock"]:
+            stats["llm_calls"] += 1
+        choice = resp.choices[0]
+        summary = (choice.message.content or "").strip()
+        if summary and choice.finish_reason == "stop":
+            cache.set(key, summary)
+            return summary
+    raise RuntimeError(f"評論摘要失敗（finish_reason={choice.finish_reason}，"
+                       f"{'空白' if not summary else '被截斷'}），請稍後再試。")
+
+
+def _summarize_all(kind, prompt, groups, limit, max_tokens, stats):
+    """同時摘要多組文字（最多 SUMMARY_CONCURRENCY 個呼叫同時進行），保持原本順序"""
+    contents = ["\n".join(g) for g in groups]
+    if len(contents) == 1:
+        return [_summarize(kind, prompt, contents[0], limit, max_tokens, stats)]
+    with ThreadPoolExecutor(max_workers=min(SUMMARY_CONCURRENCY, len(contents))) as executor:
+        return list(executor.map(
+            lambda c: _summarize(kind, prompt, c, limit, max_tokens, stats), contents
+        ))
+
+
+def _select_within_budget(items, order, budget, top_k):
+    """依排名挑評論，直到 token 預算或 top_k 用完；回傳挑中的 index"""
+    picked, used = [], 0
+    for i in order[:top_k * 2]:
+        n = count_tokens(review_line(items[i]))
+        if used + n > budget:
+            if picked:
+                break
+            continue
+        picked.append(i)
+        used += n
+        if len(picked) >= top_k:
+            break
+    return picked
+
+
+def build_context(reviews, question=None, corpus=None):
+    """
+    把評論整理成提問用的上下文：
+    - 檢索模式（預設）且評論超過 RETRIEVAL_TOKEN_BUDGET：用 BM25 依問題挑出最相關的評論，在這個預算內送出
+    - 沒有用檢索（問題跟評論幾乎對不上，例如「整體評價如何」，或 ASK_CONTEXT_MODE=summary）：
+      評論總量在 DIRECT_TOKEN_BUDGET 內就直接用全部原文，超過才做 map-reduce 摘要
+    回傳 (context, stats)；stats 記錄原文 / 實際送出的 token 數、呼叫次數、挑中的評論與耗時。
+    """
+    t0 = time.perf_counter()
+    items = [r for r in reviews if (r.get("text") or "").strip()]
+    lines = [review_line(r) for r in items]
+    content = "\n".join(lines)
+    corpus_tokens = count_tokens(content)
+    stats = {"lock": threading.Lock(), "mode": "direct", "reviews": len(lines),
+             "corpus_tokens": corpus_tokens, "chunks": 0, "rounds": 0,
+             "llm_calls": 0, "cached_calls": 0}
+
+    # RETRIEVAL_TOKEN_BUDGET 只決定要不要試檢索；檢索沒結果時，DIRECT_TOKEN_BUDGET 以內照樣整包送
+    retrieval = CONTEXT_MODE == "retrieval" and question
+    if retrieval and corpus_tokens > RETRIEVAL_TOKEN_BUDGET:
+        from modules.retrieval import rank_reviews
+        from modules.answer_cache import corpus_hash
+        order, score = rank_reviews(corpus or corpus_hash(reviews),
+                                    [r.get("text") or "" for r in items], question)
+        if len(order) >= RETRIEVAL_MIN_HITS:
+            picked = _select_within_budget(items, order, RETRIEVAL_TOKEN_BUDGET, RETRIEVAL_TOP_K)
+            stats["mode"] = "retrieval"
+            stats["matched"] = int(len(order))
+            # 編號讓模型可以引用，也對應到回答下方列出的評論
+            content = "\n".join(f"[{n}] {lines[i]}" for n, i in enumerate(picked, 1))
+            stats["sources"] = [{
+                "n": n,
+                "review_id": items[i].get("review_id"),
+                "rating": items[i].get("rating"),
+                "date": items[i].get("date"),
+                "text": (items[i].get("text") or "")[:120],
+                "score": round(float(score[i]), 3),
+            } for n, i in enumerate(picked, 1)]
+
+    if stats["mode"] == "direct" and corpus_tokens > DIRECT_TOKEN_BUDGET:
+        stats["mode"] = "map_reduce"
+        final_key = _key("final", content)
+        cached = get_summary_cache().get(final_key)
+        if cached is not None:
+            content = cached
+            stats["cached_calls"] += 1
+        else:
+            chunks = chunk_by_tokens(lines)
+            stats["chunks"] = len(chunks)
+            summaries = _summarize_all("map", MAP_PROMPT, [c for c, _ in chunks], 300,
+                                       CHUNK_SUMMARY_TOKENS, stats)
+            stats["rounds"] = 1
+            # 摘要合起來還是太長就再分組 reduce 一輪，直到塞進 FINAL_SUMMARY_TOKENS，最多 MAX_REDUCE_ROUNDS 輪
+            for _ in range(MAX_REDUCE_ROUNDS):
+                if len(summaries) == 1 and count_tokens(summaries[0]) <= FINAL_SUMMARY_TOKENS:
+                    break
+                groups = [c for c, _ in chunk_by_tokens(summaries)]
+                summaries = _summarize_all("reduce", REDUCE_PROMPT, groups, 800,
+                                           FINAL_SUMMARY_TOKENS, stats)
+                stats["rounds"] += 1
+            # 輪數用完還超過（模型沒照字數上限寫）就直接截斷
+            content = truncate_tokens("\n".join(summaries), FINAL_SUMMARY_TOKENS)
+            get_summary_cache().set(final_key, content)
+
+    stats.pop("lock")
+    stats["context_tokens"] = count_tokens(content) if stats["mode"] != "direct" else corpus_tokens
+    stats["tokens_saved"] = corpus_tokens - stats["context_tokens"]
+    stats["seconds"] = round(time.perf_counter() - t0, 2)
+    return content, stats
@@ -0,0 +1,79 @@
+# modules/waits.py
+
+import time
+
+# 在頁面裡用 MutationObserver 等「評論卡片變多」或「載入中的轉圈消失」，
+# 由 execute_async_script 呼叫，最後一個參數是 Selenium 給的 callback。
+WAIT_FOR_CARDS_JS = """
+    const [root, prev, timeoutMs, done] = arguments;
+    const count = () => root.querySelectorAll('[data-review-id]').length;
+    const spinner = () => root.querySelector("[role='progressbar']");
+    let sawSpinner = !!spinner();
+    let finished = false;
+    const finish = () => {
+      if (finished) return;
+      finished = true;
+      obs.disconnect();
+      clearTimeout(timer);
+      done(count());
+    };
+    const check = () => {
+      if (spinner()) sawSpinner = true;
+      // 卡片變多，或轉圈出現後又消失（代表已經到底，沒有更多評論）
+      if (count() > prev || (sawSpinner && !spinner())) finish();
+    };
+    const obs = new MutationObserver(check);
+    const timer = setTimeout(finish, timeoutMs);
+    obs.observe(root, {childList: true, subtree: true});
+    check();
+"""
+
+
+class AdaptiveWaiter:
+    """
+    依照最近幾次「等到新卡片」實際花的時間調整逾時：
+    timeout = clamp(factor × 平均載入時間, min_timeout, max_timeout)。
+    同時記錄總共花多少時間在等待，方便跟實際工作時間比較。
+    """
+
+    def __init__(self, initial=1.5, min_timeout=1.0, max_timeout=10.0, factor=3.0, alpha=0.3):
+        self.avg = initial
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.alpha = alpha
+        self.wait_seconds = 0.0
+        self.started_at = time.time()
+
+    @property
+    def timeout(self):
+        return max(self.min_timeout, min(self.max_timeout, self.avg * self.factor))
+
+    def wait_for_cards(self, driver, root, prev_count):
+        """等到 root 底下的評論卡片多於 prev_count（或逾時），回傳最新卡片數"""
+        timeout = self.timeout
+        driver.set_script_timeout(timeout + 5)
+        t0 = time.time()
+        count = driver.execute_async_script(WAIT_FOR_CARDS_JS, root, prev_count,
+                                            int(timeout * 1000))
+        elapsed = time.time() - t0
+        self.wait_seconds += elapsed
+        if count > prev_count:
+            # 只用成功載入的時間更新平均，逾時不算
+            self.avg = (1 - self.alpha) * self.avg + self.alpha * elapsed
+        return count
+
+    def until(self, wait, condition):
+        """包一層 WebDriverWait.until，把等待時間算進統計"""
+        t0 = time.time()
+        try:
+            return wait.until(condition)
+        finally:
+            self.wait_seconds += time.time() - t0
+
+    def summary(self):
+        total = time.time() - self.started_at
+        return {
+            "wait_seconds": round(self.wait_seconds, 2),
+            "work_seconds": round(max(total - self.wait_seconds, 0.0), 2),
+        }
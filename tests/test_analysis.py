@@ -0,0 +1,55 @@
+from modules.analysis import doc_terms, rank_keywords, query_words, with_bigrams, top_indices, \
+    BOUNDARY
+
+STOPWORDS = frozenset({"真的", "非常"})
+
+
+def test_doc_terms_joins_adjacent_words():
+    terms = doc_terms(["早餐", "好吃", "服務", "親切"], max_ngram=2, stopwords=STOPWORDS)
+    assert terms == ["早餐", "好吃", "服務", "親切", "早餐好吃", "好吃服務", "服務親切"]
+
+
+def test_doc_terms_breaks_at_punctuation_and_stopwords():
+    words = ["早餐", "好吃", BOUNDARY, "房間", "真的", "乾淨"]
+    terms = doc_terms(words, max_ngram=3, stopwords=STOPWORDS)
+    assert "早餐好吃" in terms
+    assert "好吃房間" not in terms
+    assert "房間乾淨" not in terms
+    assert "真的" not in terms
+
+
+def test_rank_keywords_counts_and_docs():
+    docs = [["早餐", "早餐", "好吃"], ["早餐", "停車"], ["停車"]]
+    ranked = {r["keyword"]: r for r in rank_keywords(docs, method="count")}
+    assert (ranked["早餐"]["count"], ranked["早餐"]["docs"]) == (3, 2)
+    assert (ranked["停車"]["count"], ranked["停車"]["docs"]) == (2, 2)
+    assert [r["keyword"] for r in rank_keywords(docs, top_n=1, method="count")] == ["早餐"]
+
+
+def test_rank_keywords_min_docs():
+    docs = [["早餐", "好吃"], ["早餐"]]
+    assert [r["keyword"] for r in rank_keywords(docs, method="docs", min_docs=2)] == ["早餐"]
+
+
+def test_rank_keywords_tfidf_normalizes_long_reviews():
+    # 一則長評論重複很多次的詞，次數最多，但 TF 以評論長度正規化後不會排第一
+    docs = [["停車"] * 5 + ["房間"] * 5, ["早餐"], ["早餐"]]
+    assert rank_keywords(docs, method="count")[0]["keyword"] in ("停車", "房間")
+    assert rank_keywords(docs, method="tfidf")[0]["keyword"] == "早餐"
+
+
+def test_rank_keywords_empty():
+    assert rank_keywords([[], []]) == []
+
+
+def test_top_indices_skips_zero_scores_and_breaks_ties_by_index():
+    assert top_indices([0.0, 2.0, 1.0, 2.0], 3) == [1, 3, 2]
+    assert top_indices([0.0, 0.0], 5) == []
+
+
+def test_query_words_drops_function_words():
+    assert query_words(["床", "的", "很", "停車", "真的"]) == ["床", "停車"]
+
+
+def test_with_bigrams():
+    assert with_bigrams(["停車位", "好", "ok"]) == ["停車位", "好", "ok", "停車", "車位"]
@@ -0,0 +1,71 @@
+import datetime
+import pytest
+from modules.dates import TimeTextParser, ParsedDate, zh_number, DAY, WEEK, MONTH, YEAR, UNKNOWN
+
+NOW = datetime.datetime(2025, 6, 15, 12, 0)
+
+
+@pytest.fixture
+def parser():
+    return TimeTextParser(now=NOW)
+
+
+@pytest.mark.parametrize("time_txt, date, precision", [
+    ("3 個月前", datetime.date(2025, 3, 15), MONTH),
+    ("十一個月前", datetime.date(2024, 7, 15), MONTH),
+    ("二十天前", datetime.date(2025, 5, 26), DAY),
+    ("十個月前", datetime.date(2024, 8, 15), MONTH),
+    ("兩週前", datetime.date(2025, 6, 1), WEEK),
+    ("1 年前", datetime.date(2024, 6, 15), YEAR),
+    ("昨天", datetime.date(2025, 6, 14), DAY),
+    ("3 months ago", datetime.date(2025, 3, 15), MONTH),
+    ("a year ago", datetime.date(2024, 6, 15), YEAR),
+    ("an hour ago", datetime.date(2025, 6, 15), DAY),
+    ("yesterday", datetime.date(2025, 6, 14), DAY),
+    ("2019年5月", datetime.date(2019, 5, 1), MONTH),
+    ("2019/05/12", datetime.date(2019, 5, 12), DAY),
+    ("May 12, 2019", datetime.date(2019, 5, 12), DAY),
+    ("Sep 2019", datetime.date(2019, 9, 1), MONTH),
+    ("2019/13/40", datetime.date(2019, 1, 1), YEAR),
+    ("看不懂", datetime.date(2025, 6, 15), UNKNOWN),
+    ("", datetime.date(2025, 6, 15), UNKNOWN),
+])
+def test_parse(parser, time_txt, date, precision):
+    parsed = parser.parse(time_txt)
+    assert (parsed.date, parsed.precision) == (date, precision)
+
+
+@pytest.mark.parametrize("time_txt", ["3 個月前 (已編輯)", "Edited 2 weeks ago"])
+def test_edited(parser, time_txt):
+    assert parser.parse(time_txt).edited
+
+
+def test_call_returns_date(parser):
+    assert parser("2 年前") == datetime.date(2023, 6, 15)
+
+
+def test_none_is_unknown(parser):
+    assert parser.parse(None).precision == UNKNOWN
+
+
+def test_cache(parser):
+    for _ in range(3):
+        parser.parse("1 年前")
+    parser.parse("2 年前")
+    assert (parser.misses, parser.hits) == (2, 2)
+
+
+@pytest.mark.parametrize("n, value", [("3", 3), ("兩", 2), ("十", 10), ("十一", 11),
+                                      ("二十", 20), ("九十九", 99)])
+def test_zh_number(n, value):
+    assert zh_number(n) == value
+
+
+@pytest.mark.parametrize("precision, latest", [
+    (DAY, datetime.date(2024, 12, 21)),
+    (MONTH, datetime.date(2025, 1, 20)),
+    (YEAR, datetime.date(2025, 12, 20)),
+    (UNKNOWN, datetime.date(2024, 12, 20)),
+])
+def test_latest(precision, latest):
+    assert ParsedDate(datetime.date(2024, 12, 20), precision).latest() == latest
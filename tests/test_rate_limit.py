@@ -0,0 +1,82 @@
+import time
+import asyncio
+import threading
+import pytest
+from modules.rate_limit import TokenBucket, RateLimiter, RateLimitTimeout, INTERACTIVE, BACKGROUND
+
+
+def test_bucket_spends_and_reports_wait():
+    bucket = TokenBucket(rate=0.001, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+
+
+def test_background_reserve_is_left_for_interactive_calls():
+    bucket = TokenBucket(rate=0.001, capacity=2)
+    assert bucket.try_acquire(reserve=1) == 0
+    # 剩 1 個是保留額度：背景拿不到，互動請求可以
+    assert bucket.try_acquire(reserve=1) > 0
+    assert bucket.try_acquire() == 0
+
+
+def test_pause_empties_the_bucket():
+    bucket = TokenBucket(rate=1000, capacity=5)
+    bucket.pause(60)
+    assert bucket.try_acquire() > 50
+
+
+def test_shared_bucket_in_sqlite(tmp_path):
+    db = str(tmp_path / "bucket.db")
+    a = TokenBucket(rate=0.001, capacity=1, db_path=db)
+    b = TokenBucket(rate=0.001, capacity=1, db_path=db)
+    assert a.try_acquire() == 0
+    assert b.try_acquire() > 0
+
+
+def wait_for_queue(limiter, n, timeout=5.0):
+    deadline = time.time() + timeout
+    while len(limiter._queue) < n:
+        assert time.time() < deadline, "排隊的呼叫沒有進 queue"
+        time.sleep(0.01)
+
+
+def test_interactive_calls_jump_ahead_of_queued_background_calls():
+    bucket = TokenBucket(rate=20, capacity=1)
+    bucket.pause(0.3)
+    limiter = RateLimiter(bucket, max_wait=10)
+    order = []
+
+    def call(name, priority):
+        limiter.acquire(priority)
+        order.append(name)
+
+    threads = []
+    for name, priority in [("bg1", BACKGROUND), ("bg2", BACKGROUND), ("ui", INTERACTIVE)]:
+        t = threading.Thread(target=call, args=(name, priority))
+        t.start()
+        threads.append(t)
+        wait_for_queue(limiter, len(threads))
+    for t in threads:
+        t.join()
+    assert order == ["ui", "bg1", "bg2"]
+
+
+def test_acquire_times_out():
+    bucket = TokenBucket(rate=0.001, capacity=1)
+    bucket.try_acquire()
+    limiter = RateLimiter(bucket, max_wait=0.2)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(BACKGROUND)
+    assert limiter._queue == []
+
+
+def test_acquire_async():
+    bucket = TokenBucket(rate=1000, capacity=2)
+    limiter = RateLimiter(bucket, max_wait=5)
+
+    async def main():
+        await asyncio.gather(*(limiter.acquire_async() for _ in range(5)))
+
+    asyncio.run(main())
+    assert limiter._queue == []
@@ -0,0 +1,72 @@
+import pytest
+from modules.review_sessions import page_reviews, REVIEWS_MAX_PAGE_SIZE
+
+# 新到舊，和 load_reviews 的順序一樣
+REVIEWS = [
+    {"review_id": f"r{i}", "rating": i % 5 + 1,
+     "date": f"{2024 - i // 10}-{12 - i % 10:02d}-01" if i != 7 else None}
+    for i in range(45)
+]
+
+
+def ids(page):
+    return [r["review_id"] for r in page["reviews"]]
+
+
+def test_first_page():
+    page = page_reviews(REVIEWS, limit=20)
+    assert ids(page) == [f"r{i}" for i in range(20)]
+    assert page["total"] == 45
+    assert page["next_cursor"]
+
+
+def test_cursor_walks_every_review_once():
+    seen, cursor = [], None
+    while True:
+        page = page_reviews(REVIEWS, cursor=cursor, limit=20)
+        seen += ids(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [r["review_id"] for r in REVIEWS]
+
+
+def test_filters():
+    page = page_reviews(REVIEWS, rating=5, limit=100)
+    assert page["total"] == 9
+    assert all(r["rating"] == 5 for r in page["reviews"])
+    page = page_reviews(REVIEWS, year=2023, limit=100)
+    assert ids(page) == [f"r{i}" for i in range(10, 20)]
+    assert page["next_cursor"] is None
+
+
+def test_sort_keeps_missing_dates_last():
+    oldest = page_reviews(REVIEWS, sort="oldest", limit=100)["reviews"]
+    dates = [r["date"] for r in oldest]
+    assert dates[-1] is None
+    assert dates[:-1] == sorted(dates[:-1])
+    by_rating = page_reviews(REVIEWS, sort="rating_desc", limit=100)["reviews"]
+    assert [r["rating"] for r in by_rating] == sorted((r["rating"] for r in REVIEWS), reverse=True)
+
+
+def test_cursor_from_other_filters_is_rejected():
+    cursor = page_reviews(REVIEWS, rating=5, limit=2)["next_cursor"]
+    with pytest.raises(ValueError):
+        page_reviews(REVIEWS, cursor=cursor, rating=4)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30"])
+def test_bad_cursor(cursor):
+    with pytest.raises(ValueError):
+        page_reviews(REVIEWS, cursor=cursor)
+
+
+def test_bad_sort():
+    with pytest.raises(ValueError):
+        page_reviews(REVIEWS, sort="random")
+
+
+def test_limit_is_clamped():
+    many = [{"review_id": str(i), "rating": 5, "date": "2024-01-01"} for i in range(300)]
+    assert len(page_reviews(many, limit=1000)["reviews"]) == REVIEWS_MAX_PAGE_SIZE
+    assert len(page_reviews(many, limit=-5)["reviews"]) == 1
@@ -0,0 +1,139 @@
+import sqlite3
+import importlib.util
+import pytest
+from modules import review_store
+
+# 分詞（refresh_keyword_counts）才需要 jieba
+requires_jieba = pytest.mark.skipif(importlib.util.find_spec("jieba") is None,
+                                    reason="jieba 沒有安裝")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """每個測試一個全新的 SQLite 檔"""
+    monkeypatch.setattr(review_store, "DATABASE_URL", f"sqlite:///{tmp_path / 'reviews.db'}")
+    monkeypatch.setattr(review_store, "_engine", None)
+    monkeypatch.setattr(review_store, "_Session", None)
+    yield review_store
+    if review_store._engine is not None:
+        review_store._engine.dispose()
+
+
+def review(rid, text, date="2024-03-01", rating=5):
+    return {"review_id": rid, "author": "a", "rating": rating, "time_txt": "",
+            "date": date, "text": text}
+
+
+def keywords(rows):
+    return {r["keyword"]: r for r in rows}
+
+
+@requires_jieba
+def test_refresh_only_segments_new_reviews(store):
+    store.save_reviews("p", [review("1", "早餐好吃，房間乾淨"), review("2", "早餐好吃")])
+    assert store.refresh_keyword_counts("p")["documents"] == 2
+    assert store.refresh_keyword_counts("p")["documents"] == 0
+    store.save_reviews("p", [review("3", "早餐普通", rating=2)])
+    assert store.refresh_keyword_counts("p")["documents"] == 1
+
+    stats = keywords(store.top_keywords("p", method="docs"))
+    assert stats["早餐"]["docs"] == 3
+    assert stats["早餐好吃"]["docs"] == 2
+
+
+@requires_jieba
+def test_repeated_word_counts_once_per_review(store):
+    store.save_reviews("p", [review("1", "早餐，早餐，早餐"), review("2", "早餐")])
+    store.refresh_keyword_counts("p")
+    stats = keywords(store.top_keywords("p", method="count"))
+    assert (stats["早餐"]["count"], stats["早餐"]["docs"]) == (4, 2)
+
+
+@requires_jieba
+def test_year_range(store):
+    # 只出現在一則評論的詞不列入排名，每個詞至少給兩則
+    store.save_reviews("p", [review("1", "早餐好吃", date="2022-05-01"),
+                             review("2", "早餐好吃", date="2023-05-01"),
+                             review("3", "早餐好吃", date="2023-07-01"),
+                             review("4", "停車方便", date="2024-06-01"),
+                             review("5", "停車方便", date="2024-08-01")])
+    store.refresh_keyword_counts("p")
+    in_2023 = keywords(store.top_keywords("p", 2023, 2024, method="docs"))
+    assert in_2023["早餐"]["docs"] == 2
+    assert "停車" not in in_2023
+    assert keywords(store.top_keywords("p", 2022, 2025, method="docs"))["早餐"]["docs"] == 3
+    assert "早餐" not in keywords(store.top_keywords("p", 2024, 2025, method="docs"))
+
+
+@requires_jieba
+def test_places_are_separate(store):
+    store.save_reviews("a", [review("1", "早餐好吃")])
+    store.save_reviews("b", [review("1", "停車方便")])
+    store.refresh_keyword_counts("a")
+    store.refresh_keyword_counts("b")
+    assert "停車" not in keywords(store.top_keywords("a", method="docs"))
+    assert "早餐" not in keywords(store.top_keywords("b", method="docs"))
+
+
+@requires_jieba
+def test_keyword_ratings(store):
+    store.save_reviews("p", [review("1", "早餐好吃", rating=5),
+                             review("2", "早餐難吃", rating=1),
+                             review("3", "早餐普通", rating=None),
+                             review("4", "停車方便", rating=4)])
+    store.refresh_keyword_counts("p")
+    table = store.keyword_ratings("p", ["早餐", "停車", "沒出現"])
+    assert table["labels"] == ["早餐", "停車", "沒出現"]
+    assert table["counts"][5] == [1, 0, 0]
+    assert table["counts"][1] == [1, 0, 0]
+    assert table["counts"][4] == [0, 1, 0]
+    # 沒有星等的評論也算提到，但不進平均
+    assert table["mentions"] == [3, 1, 0]
+    assert table["avg_rating"] == [3.0, 4.0, None]
+
+
+@requires_jieba
+def test_migrates_old_keyword_tables(tmp_path, store):
+    with sqlite3.connect(tmp_path / "reviews.db") as conn:
+        conn.execute("CREATE TABLE keyword_counts (place_id VARCHAR(255), year INTEGER,"
+                     " keyword VARCHAR(255), count INTEGER, docs INTEGER,"
+                     " PRIMARY KEY (place_id, year, keyword))")
+        conn.execute("INSERT INTO keyword_counts VALUES ('p', 2024, '舊資料', 1, 1)")
+        conn.execute("CREATE TABLE reviews (id INTEGER PRIMARY KEY, place_id VARCHAR(255) NOT NULL,"
+                     " review_id VARCHAR(255) NOT NULL, author VARCHAR(255), rating INTEGER,"
+                     " time_txt VARCHAR(64), date DATE, text TEXT, scraped_at DATETIME,"
+                     " UNIQUE (place_id, review_id))")
+        conn.execute("INSERT INTO reviews (place_id, review_id, date, text)"
+                     " VALUES ('p', 'old', '2024-01-01', '早餐好吃')")
+    store.refresh_keyword_counts("p")
+    stats = keywords(store.top_keywords("p", method="docs"))
+    assert "舊資料" not in stats
+    assert "早餐" in stats
+    assert store.load_reviews("p")[0]["date_precision"] is None
+
+
+def test_save_reviews_skips_known_ids(store):
+    assert store.save_reviews("p", [review("1", "a"), review("2", "b"), review("2", "b")]) == 2
+    assert store.save_reviews("p", [review("2", "b"), review("3", "c")]) == 1
+    assert [r["review_id"] for r in store.load_reviews("p")] == ["1", "2", "3"]
+
+
+def test_concurrent_saves_of_the_same_place(store):
+    import threading
+    batch = [review(str(i), f"text {i}") for i in range(500)]
+    added, errors = [], []
+
+    def save():
+        try:
+            added.append(store.save_reviews("p", batch, full_scan=True))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sorted(added) == [0, 500]
+    assert len(store.load_reviews("p")) == 500